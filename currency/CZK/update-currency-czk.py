@@ -1,12 +1,19 @@
 #!/usr/bin/env python3
 
 import requests
-from datetime import datetime
+from array import array
+from datetime import datetime, timedelta
+from pathlib import Path
 import sys
 import argparse
 import os
 import re
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from pricedb import crossrate, fetch, formats, market_calendar, publish, resample, store
+from pricedb.cache import FOREVER
+from pricedb.manifest import Manifest
+
 # Still existing currencies
 currencies_existing = [
     "AUD",  # Australian Dollar
@@ -70,6 +77,241 @@ currencies_discontinued = [
 ]
 
 
+CNB_URL = "https://www.cnb.cz/cs/financni-trhy/devizovy-trh/kurzy-devizoveho-trhu/kurzy-devizoveho-trhu/"
+# First year of history we publish.
+START_YEAR = 2000
+
+# Module-level fetcher, initialised in main() from the command line.
+_fetcher = None
+# Manifest of the generated ledgers in the working directory, loaded in main().
+_manifest = None
+# Lines added or changed by this run, for the delta feeds; created in main().
+_delta = None
+# Extra PriceSeries outputs (resampled ledgers, year shards) from the command
+# line, set in main().
+_outputs = {}
+
+
+def fetch_currency(currency, start_date_str, end_date_str, ttl=0):
+    """Download one currency's fixings between two DD.MM.YYYY dates via vybrane.txt."""
+    params_template = "?od={start_date}&do={end_date}&mena={currency}&format=txt"
+    url = CNB_URL + "vybrane.txt" + params_template.format(
+        start_date=start_date_str, end_date=end_date_str, currency=currency
+    )
+    response = _fetcher.get(url, ttl=ttl)
+    response.raise_for_status()
+
+    text = response.text
+    match = re.search(r"Množství: (\d+)", text.partition("\n")[0])
+    quantity = int(match.group(1)) if match else 1
+    return list(formats.cnb_rates(text, quantity))
+
+
+def fetch_year(year):
+    """Download the CNB fixing of every currency for every day of ``year``.
+
+    Files of finished years never change, so they are cached for good (after a
+    week's grace for the last fixings of December)."""
+    ttl = FOREVER if year < (datetime.today() - timedelta(days=7)).year else 0
+    response = _fetcher.get(CNB_URL + "rok.txt", params={"rok": year}, ttl=ttl)
+    response.raise_for_status()
+    return response.text
+
+
+def parse_year(text, rows_by_currency, end_date):
+    """Fan the rows of one yearly file out into ``rows_by_currency``.
+
+    Only currencies already keyed in ``rows_by_currency`` are collected (see
+    ``formats.cnb_year`` for the file layout)."""
+    for code, date_obj, rate in formats.cnb_year(text, rows_by_currency):
+        if date_obj <= end_date:
+            rows_by_currency[code].append((date_obj, rate))
+
+
+def currency_series(currency):
+    """The stored series of one currency, rendered as e.g.
+    'P 2025/08/08 USD 22.784 CZK' (rates rounded to 7 decimals).
+
+    The monthly file keeps the first fixing of each month."""
+    return store.PriceSeries(
+        f"{currency}CZK", currency, "CZK", spec="", digits=7, latest_line=False,
+        delta=_delta, **_outputs,
+    )
+
+
+def last_ledger_date(path):
+    """Date of the last price line in a ledger file, or None if missing/empty.
+
+    Comes from the manifest when it still matches the file, else from its tail."""
+    return _manifest.last_date(path)
+
+
+def write_ledgers(currency, rows):
+    """Store one currency's [(date, rate)] and render its daily and monthly ledgers."""
+    series = currency_series(currency)
+    changed = series.write(rows)
+    for path in series.ledger_paths():
+        _manifest.record(path)
+    if changed:
+        print(f"{currency}: {len(rows)} entries saved.")
+    else:
+        print(f"{currency}: {len(rows)} entries, unchanged.")
+
+
+def append_ledgers(currency, rows, last_date):
+    """Append the rows newer than ``last_date`` to the store and both ledgers.
+
+    A new row only goes into the monthly file when it opens a month the file
+    does not have yet."""
+    series = currency_series(currency)
+    new_rows = [(d, rate) for d, rate in rows if d > last_date]
+    if not new_rows:
+        _manifest.record(series.ledger_path)
+        print(f"{currency}: up to date (last {last_date:%Y-%m-%d})")
+        return
+
+    series.extend(new_rows)
+    for path in series.ledger_paths():
+        _manifest.record(path)
+    print(f"{currency}: appended {len(new_rows)} entries.")
+
+
+def save_rows(currency, rows, last_date):
+    """Rewrite the ledgers when there is no usable ``last_date``, else append."""
+    if last_date is None:
+        write_ledgers(currency, rows)
+    else:
+        append_ledgers(currency, rows, last_date)
+
+
+def update_cross_rates(bases, currencies):
+    """Price every currency (and CZK) in each of ``bases`` from the stored CZK rates.
+
+    Writes e.g. USDEUR.ledger and CZKEUR.ledger for base EUR; a pair only has
+    the days both currencies were fixed."""
+    columns = {}
+    for currency in dict.fromkeys([*bases, *currencies]):
+        col = currency_series(currency).load()
+        if col is not None and len(col):
+            columns[currency] = col
+    for base in bases:
+        base_col = columns.get(base)
+        if base_col is None:
+            print(f"No rates for {base}, skipping its cross rates")
+            continue
+        czk = store.Columns(None, base_col.days, array("d", [1.0]) * len(base_col))
+        changed = 0
+        for currency, col in [*columns.items(), ("CZK", czk)]:
+            if currency == base:
+                continue
+            days, values = crossrate.cross(col, base_col)
+            if not days:
+                continue
+            digits = crossrate.decimals(values)
+            series = store.PriceSeries(
+                f"{currency}{base}", currency, base, spec=f".{digits}f",
+                digits=digits, latest_line=False, delta=_delta, **_outputs,
+            )
+            changed += series.sync(store.dated(days, values))
+            for path in series.ledger_paths():
+                _manifest.record(path)
+        print(f"{base} cross rates: {changed} series changed.")
+
+
+def up_to_date(last_date, end_date_obj):
+    """True if no CNB fixing can have been published after ``last_date``."""
+    return last_date is not None and not market_calendar.new_data_possible(
+        market_calendar.CNB, last_date, end_date_obj
+    )
+
+
+def update_per_currency(currencies, end_date_obj, full_rebuild, buffer_days):
+    """Download each currency's history with its own request."""
+    end_date_str = end_date_obj.strftime("%d.%m.%Y")
+    last_dates = {
+        currency: None if full_rebuild else last_ledger_date(f"{currency}CZK.ledger")
+        for currency in currencies
+    }
+    pending = []
+    for currency in currencies:
+        if up_to_date(last_dates[currency], end_date_obj):
+            print(f"{currency} is up to date")
+        else:
+            pending.append(currency)
+
+    def download(currency):
+        last_date = last_dates[currency]
+        if last_date is None:
+            return fetch_currency(currency, f"01.01.{START_YEAR}", end_date_str)
+        start_date_str = (last_date - timedelta(days=buffer_days)).strftime("%d.%m.%Y")
+        if currency in currencies_discontinued and last_date.year < end_date_obj.year:
+            # Quoting stopped in an earlier year: pin the window to that year so
+            # the request is identical every run and can be cached for good.
+            return fetch_currency(
+                currency, start_date_str, f"31.12.{last_date.year}", ttl=FOREVER
+            )
+        return fetch_currency(currency, start_date_str, end_date_str)
+
+    for currency, future in _fetcher.map(download, pending):
+        print(f"Downloading {currency}...")
+        try:
+            rows = future.result()
+        except requests.RequestException as e:
+            print(f"Failed to download {currency}: {e}")
+            continue
+
+        if not rows:
+            print(f"No data for {currency}")
+            continue
+
+        save_rows(currency, rows, last_dates[currency])
+
+
+def update_bulk(currencies, end_date_obj, full_rebuild, buffer_days):
+    """Download the yearly all-currency files and fan them out per currency.
+
+    One request per year covers every currency at once, instead of one request
+    per currency each carrying the full history. When appending, only the years
+    from the stalest active currency onwards are fetched; discontinued currencies
+    pick up whatever those years still quote for them."""
+    last_dates = {
+        currency: None if full_rebuild else last_ledger_date(f"{currency}CZK.ledger")
+        for currency in currencies
+    }
+    if all(
+        last_date is not None
+        and (currency in currencies_discontinued or up_to_date(last_date, end_date_obj))
+        for currency, last_date in last_dates.items()
+    ):
+        print("All active currencies are up to date")
+        return
+    start_year = end_date_obj.year
+    for currency, last_date in last_dates.items():
+        if last_date is None:
+            start_year = START_YEAR
+        elif currency not in currencies_discontinued:
+            start_year = min(start_year, (last_date - timedelta(days=buffer_days)).year)
+
+    rows_by_currency = {currency: [] for currency in currencies}
+    years = range(start_year, end_date_obj.year + 1)
+    for year, future in _fetcher.map(fetch_year, years):
+        print(f"Downloading {year}...")
+        try:
+            text = future.result()
+        except requests.RequestException as e:
+            # A missing year would silently truncate every ledger; bail out instead.
+            sys.exit(f"Failed to download {year}: {e}")
+        parse_year(text, rows_by_currency, end_date_obj)
+
+    for currency in currencies:
+        rows = rows_by_currency[currency]
+        if not rows:
+            print(f"No data for {currency}")
+            continue
+        rows.sort(key=lambda r: r[0])
+        save_rows(currency, rows, last_dates[currency])
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Download CNB exchange rates and convert to ledger format."
@@ -85,84 +327,80 @@ def main():
         action="store_true",
         help="Include discontinued currencies in processing",
     )
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="Download the yearly all-currency files (one request per year) "
+        "instead of one full-history request per currency",
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--since-last",
+        dest="full_rebuild",
+        action="store_false",
+        default=False,
+        help="Fetch only the window after the last date in each ledger and append "
+        "the new fixings (default)",
+    )
+    mode.add_argument(
+        "--full-rebuild",
+        dest="full_rebuild",
+        action="store_true",
+        help="Download the whole history and rewrite every ledger from scratch",
+    )
+    parser.add_argument(
+        "--buffer-days",
+        type=int,
+        default=7,
+        help="Days of backward overlap when fetching the incremental update.",
+    )
+    resample.add_arguments(parser)
+    publish.add_arguments(parser)
+    crossrate.add_arguments(parser)
+    fetch.add_arguments(parser)
     args = parser.parse_args()
+    try:
+        granularities = resample.from_args(args)
+    except ValueError as e:
+        sys.exit(f"Error: {e}")
 
-    # Convert YYYY-MM-DD to DD.MM.YYYY
     try:
-        end_date_obj = datetime.strptime(args.end_date, "%Y-%m-%d")
+        end_date_obj = datetime.strptime(args.end_date, "%Y-%m-%d").date()
     except ValueError:
         print("Error: Invalid date format. Use YYYY-MM-DD.")
         sys.exit(1)
-    end_date_str = end_date_obj.strftime("%d.%m.%Y")
-
-    base_url = "https://www.cnb.cz/cs/financni-trhy/devizovy-trh/kurzy-devizoveho-trhu/kurzy-devizoveho-trhu/vybrane.txt"
-    params_template = "?od=01.01.2000&do={end_date}&mena={currency}&format=txt"
 
     if args.historic:
         currencies = currencies_existing + currencies_discontinued
     else:
         currencies = currencies_existing
 
-    for currency in currencies:
-        url = base_url + params_template.format(
-            end_date=end_date_str, currency=currency
-        )
-        print(f"Downloading {currency}...")
-        try:
-            response = requests.get(url)
-            response.raise_for_status()
-        except requests.RequestException as e:
-            print(f"Failed to download {currency}: {e}")
-            continue
+    bases = crossrate.from_args(args)
+    for base in bases:
+        if base not in currencies_existing + currencies_discontinued:
+            sys.exit(f"Error: unknown currency {base!r} in --cross-rates")
 
-        lines = response.text.strip().split("\n")
-        if len(lines) < 2:
-            print(f"No data for {currency}")
-            continue
+    global _fetcher, _manifest, _delta, _outputs
+    _fetcher = fetch.from_args(args)
+    _manifest = Manifest()
+    _delta = publish.DeltaLog()
+    _outputs = {
+        "granularities": granularities,
+        "shards": publish.shards_from_args(args),
+    }
 
-        match = re.search(r"Množství: (\d+)", lines[0])
-        if match:
-            quantity = int(match.group(1))
-        else:
-            quantity = 1
-
-        data_lines = lines[1:]  # Remove header line
-
-        ledger_lines = []
-        monthly_lines = []
-        last_month = None
-        for line in data_lines:
-            parts = line.split("|")
-            if len(parts) < 2:
-                continue
-            date_str = parts[0].strip()
-            rate_str = parts[1].strip().replace(",", ".")
-            try:
-                date_obj = datetime.strptime(date_str, "%d.%m.%Y")
-                rate = float(rate_str) / quantity
-            except ValueError:
-                continue
-
-            ledger_line = (
-                f"P {date_obj.strftime('%Y/%m/%d')} {currency} {round(rate, 7)} CZK"
-            )
-            ledger_lines.append(ledger_line)
-
-            # Monthly filter: first available entry for each month
-            month_key = (date_obj.year, date_obj.month)
-            if month_key != last_month:
-                monthly_lines.append(ledger_line)
-                last_month = month_key
-
-        ledger_filename = f"{currency}CZK.ledger"
-        with open(ledger_filename, "w", encoding="utf-8") as f:
-            f.write("\n".join(ledger_lines) + "\n")
-
-        monthly_filename = f"{currency}CZK-monthly.ledger"
-        with open(monthly_filename, "w", encoding="utf-8") as f:
-            f.write("\n".join(monthly_lines) + "\n")
-
-        print(f"{currency}: {len(ledger_lines)} entries saved.")
+    if args.bulk:
+        update_bulk(currencies, end_date_obj, args.full_rebuild, args.buffer_days)
+    else:
+        update_per_currency(
+            currencies, end_date_obj, args.full_rebuild, args.buffer_days
+        )
+    if bases:
+        update_cross_rates(bases, currencies)
+    _manifest.save()
+    _delta.save()
+    if args.consolidate:
+        publish.consolidate()
 
 
 if __name__ == "__main__":
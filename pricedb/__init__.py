@@ -0,0 +1 @@
+"""Shared helpers for the pricedb updater scripts."""
@@ -0,0 +1,90 @@
+"""Atomic, skip-if-unchanged file writes for everything the updaters generate.
+
+A file is rendered into ``<name>.tmp`` next to it and then compared with the
+current file, by size first and by content hash only when the sizes match. An
+identical result is discarded, so the file keeps its mtime and git has nothing
+to re-hash. A different one replaces the file with ``os.replace``, so a crash
+never leaves a half-written ledger for the nightly commit to pick up.
+"""
+import hashlib
+import os
+from pathlib import Path
+
+# Bytes hashed per read when comparing a rendered file with the current one.
+HASH_BLOCK_SIZE = 1 << 16
+
+
+def file_digest(path):
+    """sha256 digest of the content of ``path``."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.digest()
+
+
+def same_content(a, b):
+    """True if files ``a`` and ``b`` both exist with identical content."""
+    try:
+        if os.path.getsize(a) != os.path.getsize(b):
+            return False
+    except OSError:
+        return False
+    return file_digest(a) == file_digest(b)
+
+
+class AtomicFile:
+    """Context manager yielding a file that replaces ``path`` on success.
+
+    The file is UTF-8 text, or bytes with ``binary``. ``changed`` tells
+    afterwards whether ``path`` was actually rewritten. If the block raises, the
+    temp file is removed and ``path`` is left untouched."""
+
+    def __init__(self, path, newline=None, binary=False):
+        self.path = Path(path)
+        self.tmp = self.path.with_name(self.path.name + ".tmp")
+        self.newline = newline
+        self.binary = binary
+        self.changed = False
+
+    def __enter__(self):
+        if self.binary:
+            self.file = open(self.tmp, "wb")
+        else:
+            self.file = open(self.tmp, "w", encoding="utf-8", newline=self.newline)
+        return self.file
+
+    def __exit__(self, exc_type, exc, tb):
+        self.file.close()
+        if exc_type is not None or same_content(self.tmp, self.path):
+            os.unlink(self.tmp)
+        else:
+            os.replace(self.tmp, self.path)
+            self.changed = True
+        return False
+
+
+def write_lines(path, lines):
+    """Write ``lines``, each terminated by a newline; True if ``path`` changed."""
+    writer = AtomicFile(path)
+    with writer as f:
+        for line in lines:
+            f.write(line + "\n")
+    return writer.changed
+
+
+def write_text(path, text):
+    """Write ``text`` to ``path``; True if it changed."""
+    writer = AtomicFile(path)
+    with writer as f:
+        f.write(text)
+    return writer.changed
+
+
+def write_bytes(path, chunks):
+    """Write the byte strings in ``chunks`` to ``path``; True if it changed."""
+    writer = AtomicFile(path, binary=True)
+    with writer as f:
+        for chunk in chunks:
+            f.write(chunk)
+    return writer.changed
@@ -0,0 +1,174 @@
+"""On-disk HTTP response cache with conditional revalidation.
+
+Entries are keyed by a hash of the URL + query parameters and stored as two files
+in the cache directory: ``<key>.body`` with the raw response body and
+``<key>.json`` with the (redacted) URL, the validators (``ETag`` /
+``Last-Modified``), the response encoding and the time the entry was last
+confirmed fresh. Credentials passed as query parameters (``SECRET_PARAMS``) are
+left out of both, so the directory can be shared, e.g. as a CI cache.
+
+A request with a ``ttl`` (seconds) is answered straight from disk while the entry is
+younger than that; past it, the entry's validators are sent as ``If-None-Match`` /
+``If-Modified-Since`` and a ``304 Not Modified`` reply re-serves the stored body.
+Sources that can no longer change (discontinued currencies, past CNB years,
+delisted stocks) use ``FOREVER`` and never touch the network once cached.
+
+The directory is bounded by ``max_bytes``: after each store the least recently used
+entries are evicted until it fits again.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+
+# TTL for responses that can never change upstream.
+FOREVER = float("inf")
+# Default size bound of the cache directory.
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Query parameters holding credentials (compared lowercased).
+SECRET_PARAMS = {"apikey", "api_key", "access_token", "token"}
+
+
+def cache_root():
+    """Root of all persistent updater state: $PRICEDB_CACHE_DIR or ~/.cache/pricedb-czk."""
+    env = os.environ.get("PRICEDB_CACHE_DIR")
+    if env:
+        return Path(env)
+    return Path.home() / ".cache" / "pricedb-czk"
+
+
+def default_cache_dir():
+    """Directory of the HTTP response cache."""
+    return cache_root() / "http"
+
+
+def redact(url):
+    """``url`` with the values of its credential query parameters blanked out."""
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if not any(k.lower() in SECRET_PARAMS for k, _v in query):
+        return url
+    query = [(k, "REDACTED" if k.lower() in SECRET_PARAMS else v) for k, v in query]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+class CacheEntry:
+    """A stored response: body plus its metadata."""
+
+    def __init__(self, body, meta):
+        self.body = body
+        self.meta = meta
+
+    def fresh(self, ttl):
+        return time.time() - self.meta["checked_at"] < ttl
+
+    def validators(self):
+        """Conditional-request headers for revalidating this entry."""
+        headers = {}
+        if self.meta.get("etag"):
+            headers["If-None-Match"] = self.meta["etag"]
+        if self.meta.get("last_modified"):
+            headers["If-Modified-Since"] = self.meta["last_modified"]
+        return headers
+
+    def response(self, url):
+        """Rebuild a ``requests.Response`` serving the cached body."""
+        resp = requests.Response()
+        resp.status_code = 200
+        resp.url = url
+        resp._content = self.body
+        resp.encoding = self.meta.get("encoding")
+        if self.meta.get("content_type"):
+            resp.headers["Content-Type"] = self.meta["content_type"]
+        return resp
+
+
+class ResponseCache:
+    """Directory of cached response bodies and validators."""
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = Path(directory) if directory else default_cache_dir()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(url, params=None):
+        """Stable cache key for a URL and its query parameters, credentials
+        left out (so the key also survives rotating them)."""
+        items = sorted(
+            (k, v) for k, v in (params or {}).items()
+            if str(k).lower() not in SECRET_PARAMS
+        )
+        raw = json.dumps([redact(url), [[str(k), str(v)] for k, v in items]])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _paths(self, key):
+        return self.directory / f"{key}.body", self.directory / f"{key}.json"
+
+    def load(self, key):
+        """The stored entry for ``key``, or None."""
+        body_path, meta_path = self._paths(key)
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            body = body_path.read_bytes()
+        except (OSError, ValueError):
+            return None
+        # The metadata mtime doubles as the last-use time for LRU eviction.
+        os.utime(meta_path)
+        return CacheEntry(body, meta)
+
+    def touch(self, key, entry):
+        """Mark ``entry`` as confirmed fresh now (after a 304)."""
+        entry.meta["checked_at"] = time.time()
+        self._write(self._paths(key)[1], json.dumps(entry.meta).encode("utf-8"))
+
+    def store(self, key, url, resp):
+        """Store a successful response and evict down to ``max_bytes``."""
+        meta = {
+            "url": redact(url),
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+            "content_type": resp.headers.get("Content-Type"),
+            "encoding": resp.encoding,
+            "checked_at": time.time(),
+        }
+        body_path, meta_path = self._paths(key)
+        self._write(body_path, resp.content)
+        self._write(meta_path, json.dumps(meta).encode("utf-8"))
+        self.evict()
+
+    def _write(self, path, data):
+        tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits ``max_bytes``."""
+        with self._lock:
+            entries = []
+            total = 0
+            for meta_path in self.directory.glob("*.json"):
+                body_path = meta_path.with_suffix(".body")
+                try:
+                    size = meta_path.stat().st_size + body_path.stat().st_size
+                    used = meta_path.stat().st_mtime
+                except OSError:
+                    continue
+                entries.append((used, size, meta_path, body_path))
+                total += size
+            entries.sort()
+            for _used, size, meta_path, body_path in entries:
+                if total <= self.max_bytes:
+                    break
+                for path in (meta_path, body_path):
+                    try:
+                        path.unlink()
+                    except OSError:
+                        pass
+                total -= size
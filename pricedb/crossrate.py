@@ -0,0 +1,69 @@
+"""Direct cross rates between currencies that are all fixed against one currency.
+
+CNB fixes every currency against CZK on the same days, so the price of ``A`` in
+``B`` on a day is ``ACZK / BCZK`` of that day. Series are taken as stored
+columns (see ``pricedb.store``) and divided element-wise over the days both
+have; a currency quoted only over some range (a discontinued one) therefore
+gives cross rates only within that range, never a stale carried-forward rate.
+
+The stored CNB rates are per unit -- the ``Množství`` quantity of the quote
+(100 JPY, 1000 IDR) is divided out when parsing -- so a cross involving such a
+currency can be far below 1 (``IDRUSD`` is about 0.00006). Each cross series is
+printed with as many decimals as keep ``SIGNIFICANT`` significant digits of its
+smallest rate.
+"""
+import math
+from array import array
+from operator import truediv
+
+# Significant digits kept of the smallest rate of a cross series.
+SIGNIFICANT = 7
+
+
+def cross(a, b):
+    """(days, values) arrays of ``a`` priced in ``b``, on the days both have.
+
+    ``a`` and ``b`` are ``store.Columns`` (or anything with ``days`` and
+    ``values`` columns) of rates against the same currency."""
+    days, values = array("i"), array("d")
+    if a.days == b.days and 0.0 not in b.values:
+        days.frombytes(a.days.tobytes())
+        values.extend(map(truediv, a.values, b.values))
+        return days, values
+    i = j = 0
+    while i < len(a.days) and j < len(b.days):
+        a_day, b_day = a.days[i], b.days[j]
+        if a_day < b_day:
+            i += 1
+        elif b_day < a_day:
+            j += 1
+        else:
+            if b.values[j]:
+                days.append(a_day)
+                values.append(a.values[i] / b.values[j])
+            i += 1
+            j += 1
+    return days, values
+
+
+def decimals(values):
+    """Decimals to print ``values`` with: SIGNIFICANT digits of the smallest."""
+    smallest = min((abs(v) for v in values if v), default=1.0)
+    return max(0, SIGNIFICANT - 1 - math.floor(math.log10(smallest)))
+
+
+def add_arguments(parser):
+    """Add the ``--cross-rates`` option to an updater's argument parser."""
+    parser.add_argument(
+        "--cross-rates",
+        default="",
+        metavar="CURRENCIES",
+        help="Comma-separated currencies to also price every other currency in, "
+        "e.g. EUR,USD writes USDEUR.ledger, GBPUSD.ledger, CZKEUR.ledger, ...",
+    )
+
+
+def from_args(args):
+    """The quote currencies of the cross rates, from ``--cross-rates``."""
+    names = (n.strip().upper() for n in args.cross_rates.split(","))
+    return tuple(dict.fromkeys(filter(None, names)))
@@ -0,0 +1,132 @@
+"""Pooled, bounded-concurrency HTTP fetching shared by the updater scripts.
+
+Every updater downloads one document per instrument. Doing that with bare
+``requests.get`` opens a fresh TCP+TLS connection per request and waits for each
+round-trip in turn. A ``Fetcher`` keeps one keep-alive ``requests.Session`` for the
+whole run and runs the downloads on a small thread pool, with a per-host cap so a
+single server never sees more than ``per_host`` requests in flight.
+
+Results are handed back in input order, so the files a script writes (and the log
+it prints) stay deterministic no matter which download finishes first.
+
+With a ``ResponseCache`` attached, ``get`` serves and revalidates responses from
+disk (see ``pricedb.cache``).
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from pricedb.cache import ResponseCache, default_cache_dir
+
+# Default worker count for the --jobs option of the updater scripts.
+DEFAULT_JOBS = 4
+# Default cap on requests in flight to one host (--per-host); every updater talks
+# to a single server, so this is what actually bounds the load on it.
+DEFAULT_PER_HOST = 2
+
+
+class Fetcher:
+    """A shared ``requests.Session`` plus a bounded worker pool."""
+
+    def __init__(self, jobs=DEFAULT_JOBS, per_host=DEFAULT_PER_HOST, cache=None):
+        self.cache = cache
+        self.jobs = max(1, jobs)
+        self.per_host = max(1, min(per_host, self.jobs))
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.jobs)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._host_limits = {}
+        self._lock = threading.Lock()
+
+    def _host_limit(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(self.per_host)
+            return self._host_limits[host]
+
+    def get(self, url, ttl=0, **kwargs):
+        """``requests.get`` over the pooled session, honouring the per-host cap.
+
+        With a cache attached, a cached response younger than ``ttl`` seconds is
+        returned without a request; an older one is revalidated conditionally."""
+        if self.cache is None:
+            with self._host_limit(url):
+                return self.session.get(url, **kwargs)
+
+        key = self.cache.key(url, kwargs.get("params"))
+        entry = self.cache.load(key)
+        if entry is not None and entry.fresh(ttl):
+            return entry.response(url)
+
+        headers = dict(kwargs.pop("headers", None) or {})
+        if entry is not None:
+            headers.update(entry.validators())
+        with self._host_limit(url):
+            resp = self.session.get(url, headers=headers, **kwargs)
+        if resp.status_code == 304 and entry is not None:
+            self.cache.touch(key, entry)
+            return entry.response(url)
+        if resp.ok:
+            self.cache.store(key, url, resp)
+        return resp
+
+    def map(self, fn, items):
+        """Run ``fn(item)`` for every item on the pool.
+
+        Yields ``(item, future)`` pairs in the order of ``items``; call
+        ``future.result()`` to get the value or re-raise the download error."""
+        items = list(items)
+        if not items:
+            return
+        with ThreadPoolExecutor(max_workers=min(self.jobs, len(items))) as pool:
+            futures = [pool.submit(fn, item) for item in items]
+            for item, future in zip(items, futures):
+                yield item, future
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def add_arguments(parser):
+    """Add the --jobs / --per-host / --cache-dir / --no-cache options to an
+    updater's parser."""
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=DEFAULT_JOBS,
+        help=f"Number of concurrent downloads (default: {DEFAULT_JOBS})",
+    )
+    parser.add_argument(
+        "--per-host",
+        type=int,
+        default=DEFAULT_PER_HOST,
+        help="Most downloads in flight to one host, at most --jobs "
+        f"(default: {DEFAULT_PER_HOST})",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        help=f"Directory of the HTTP response cache (default: {default_cache_dir()})",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not read or write the HTTP response cache",
+    )
+
+
+def from_args(args):
+    """Build a Fetcher from the options added by ``add_arguments``."""
+    cache = None if args.no_cache else ResponseCache(args.cache_dir)
+    return Fetcher(args.jobs, per_host=args.per_host, cache=cache)
@@ -0,0 +1,131 @@
+"""Streaming readers and line formatters for the price formats the updaters handle.
+
+Readers are generators over CNB text (``vybrane.txt`` and ``rok.txt``), PSE chart
+points, Stooq CSV and ledger ``P`` lines; each yields ``(date, value)`` rows (the
+yearly CNB file also the currency code). Every date in these formats has a fixed
+width, so it is sliced and converted with ``int`` instead of ``strptime``, and
+ledger dates are rendered by a cached formatter instead of ``strftime``. The
+output is byte for byte what the per-script ``strptime``/``strftime`` code wrote.
+"""
+from datetime import date, datetime
+from functools import lru_cache
+
+# date.toordinal() of 1970-01-01, for millisecond epoch timestamps.
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+MS_PER_DAY = 86_400_000
+
+
+def ymd(text):
+    """Parse 'YYYY-MM-DD' or 'YYYY/MM/DD' into a date."""
+    if len(text) != 10:
+        raise ValueError(f"not a YYYY-MM-DD date: {text!r}")
+    return date(int(text[0:4]), int(text[5:7]), int(text[8:10]))
+
+
+def dmy(text):
+    """Parse CNB's 'DD.MM.YYYY' into a date."""
+    if len(text) != 10:
+        return datetime.strptime(text, "%d.%m.%Y").date()
+    return date(int(text[6:10]), int(text[3:5]), int(text[0:2]))
+
+
+def utc_date(ts_ms):
+    """UTC calendar date of a millisecond epoch timestamp."""
+    return date.fromordinal(EPOCH_ORDINAL + int(ts_ms // MS_PER_DAY))
+
+
+@lru_cache(maxsize=1 << 16)
+def ledger_date(day):
+    """Render a date as a ledger 'YYYY/MM/DD'."""
+    return f"{day.year:04d}/{day.month:02d}/{day.day:02d}"
+
+
+def price_line(day, commodity, value, currency, spec=".2f"):
+    """One ledger price line, e.g. 'P 2026/06/03 AAPL 310.26 USD'.
+
+    ``spec`` formats the value; "" gives ``str(value)`` (CNB's rounded rates)."""
+    return f"P {ledger_date(day)} {commodity} {value:{spec}} {currency}"
+
+
+def ledger_prices(lines):
+    """Yield (date, value) for every well-formed ``P`` line."""
+    for line in lines:
+        parts = line.split()
+        if len(parts) < 5 or parts[0] != "P":
+            continue
+        try:
+            yield ymd(parts[1]), float(parts[3])
+        except ValueError:
+            continue
+
+
+def cnb_rate(date_str, rate_str, quantity):
+    """One CNB fixing as (date, rate per unit), or None if malformed."""
+    try:
+        rate = float(rate_str.strip().replace(",", ".")) / quantity
+        return dmy(date_str.strip()), rate
+    except ValueError:
+        return None
+
+
+def cnb_rates(text, quantity):
+    """Yield (date, rate) from a one-currency ``vybrane.txt`` body (header skipped)."""
+    lines = iter(text.strip().split("\n"))
+    next(lines, None)
+    for line in lines:
+        parts = line.split("|")
+        if len(parts) < 2:
+            continue
+        row = cnb_rate(parts[0], parts[1], quantity)
+        if row is not None:
+            yield row
+
+
+def cnb_year(text, codes):
+    """Yield (code, date, rate) for the ``codes`` in a yearly ``rok.txt`` table.
+
+    The table has a ``Datum|1 AUD|100 HUF|...`` header that is repeated mid-file
+    whenever the set of quoted currencies (or a quantity) changes, so the column
+    layout is re-read on every header line."""
+    columns = []
+    for line in text.strip().split("\n"):
+        parts = line.split("|")
+        if parts[0].startswith("Datum"):
+            columns = []
+            for header in parts[1:]:
+                amount, _, code = header.strip().partition(" ")
+                try:
+                    columns.append((code, int(amount)))
+                except ValueError:
+                    columns.append((None, 1))
+            continue
+        for (code, quantity), rate_str in zip(columns, parts[1:]):
+            if code not in codes or not rate_str.strip():
+                continue
+            row = cnb_rate(parts[0], rate_str, quantity)
+            if row is not None:
+                yield (code,) + row
+
+
+def pse_points(values):
+    """Yield (date, price) from PSE chart ``[timestamp_ms, price]`` points."""
+    for ts_ms, price in values:
+        yield utc_date(ts_ms), price
+
+
+def stooq_rows(text):
+    """Yield (date, close) from a Stooq daily CSV, skipping rows without a close."""
+    lines = text.splitlines()
+    if not lines:
+        return
+    header = lines[0].split(",")
+    try:
+        date_col, close_col = header.index("Date"), header.index("Close")
+    except ValueError:
+        return
+    for line in lines[1:]:
+        parts = line.split(",")
+        if len(parts) <= close_col or not parts[close_col]:
+            continue
+        yield ymd(parts[date_col]), float(parts[close_col])
+
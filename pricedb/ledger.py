@@ -0,0 +1,148 @@
+"""Helpers for reading and maintaining ``P`` price-line ledger files in place."""
+import os
+from pathlib import Path
+
+from pricedb import formats
+
+# Bytes read per step when scanning a file backwards from EOF.
+TAIL_BLOCK_SIZE = 4096
+
+
+def tail_lines(path, count=1):
+    """Return the last ``count`` non-empty lines of ``path`` as [(offset, line)].
+
+    The file is read backwards from EOF in small blocks, so the cost does not
+    depend on its length. Offsets are byte positions of each line's start, in
+    file order; a missing file gives []."""
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return []
+    with f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        data = b""
+        # Stop once the buffer holds ``count`` complete non-empty lines.
+        while pos > 0 and len([l for l in data.split(b"\n")[1:] if l.strip()]) < count:
+            step = min(TAIL_BLOCK_SIZE, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+
+    lines = []
+    offset = pos
+    for raw in data.split(b"\n"):
+        lines.append((offset, raw))
+        offset += len(raw) + 1
+    if pos > 0:
+        lines = lines[1:]  # possibly cut in the middle
+    lines = [(o, raw.decode("utf-8").rstrip("\r")) for o, raw in lines if raw.strip()]
+    return lines[-count:]
+
+
+def ends_with_newline(path):
+    """True if ``path`` is empty or missing, or its last byte is a newline."""
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return True
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+    except FileNotFoundError:
+        return True
+
+
+def series_paths(directory="."):
+    """The daily ledgers of the price series in ``directory``, by name.
+
+    A series is a <name>.ledger with a <name>-monthly.ledger beside it, which
+    tells it apart from the delta feeds, year shards and merged files."""
+    paths = []
+    for monthly in sorted(Path(directory).glob("*-monthly.ledger")):
+        path = monthly.with_name(monthly.name[: -len("-monthly.ledger")] + ".ledger")
+        if path.exists():
+            paths.append(path)
+    return paths
+
+
+def line_date(line):
+    """Date of a ``P YYYY/MM/DD ...`` price line, or None."""
+    parts = line.split()
+    if len(parts) < 5 or parts[0] != "P":
+        return None
+    try:
+        return formats.ymd(parts[1])
+    except ValueError:
+        return None
+
+
+def last_date(path):
+    """Date of the last price line in ``path`` (read from the tail only), or None."""
+    tail = tail_lines(path, 1)
+    return line_date(tail[0][1]) if tail else None
+
+
+def append_lines(path, lines):
+    """Append ``lines`` to ``path``, first terminating an unterminated last line.
+
+    Returns the text appended."""
+    text = "".join(line + "\n" for line in lines)
+    if not ends_with_newline(path):
+        text = "\n" + text
+    # Rendered first and written in one call, so a failure while formatting
+    # the lines leaves the file as it was.
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(text)
+    return text
+
+
+def update_resampled(path, rows, format_line, period_key, anchor="first",
+                     latest_line=True):
+    """Fold new (date, value) ``rows`` into a resampled ledger without rewriting it.
+
+    A "first" file holds the first line of each period (``period_key`` of a
+    date) and, with ``latest_line``, a trailing line for the latest day when
+    that is not itself a period's first line. That trailing line is cut off, a
+    line is appended for every period the rows open, and a new trailing line is
+    added if needed. A "last" file holds the last line of each period: its last
+    line is cut off when the rows continue its period, and the last row of
+    every period the rows cover is appended (see ``resample.resample``).
+    ``rows`` must be sorted and newer than everything already in the file."""
+    if not rows:
+        return
+    if anchor == "last":
+        tail = tail_lines(path, 1)
+        keep = None
+        if tail:
+            last_day = line_date(tail[0][1])
+            if last_day and period_key(last_day) == period_key(rows[0][0]):
+                keep = tail[0][0]
+        lines = [
+            format_line(*row)
+            for row, following in zip(rows, rows[1:] + [None])
+            if following is None or period_key(following[0]) != period_key(row[0])
+        ]
+    else:
+        tail = tail_lines(path, 2)
+        periods = [period_key(d) for d in (line_date(line) for _o, line in tail) if d]
+        keep = None
+        last_period = periods[-1] if periods else None
+        if latest_line and len(periods) == 2 and periods[0] == periods[1]:
+            keep = tail[1][0]  # drop the previous "latest price" line
+
+        lines = []
+        period_first = False
+        for date, value in rows:
+            key = period_key(date)
+            period_first = key != last_period
+            if period_first:
+                lines.append(format_line(date, value))
+                last_period = key
+        if latest_line and not period_first:
+            lines.append(format_line(*rows[-1]))
+
+    if keep is not None:
+        with open(path, "r+b") as f:
+            f.truncate(keep)
+    append_lines(path, lines)
@@ -0,0 +1,152 @@
+"""Per-directory index of the generated files' state.
+
+Each source directory keeps a ``manifest.json`` that records, for every ledger
+and corporate-action CSV the updater writes: first and last date, row count,
+size, byte offset and text of the last line, the time of the last fetch that
+changed it and (for dividend CSVs) the last pay date. Planning a run -- deciding
+which series are stale -- then needs this one small file instead of opening
+every ledger.
+
+An entry is only trusted while the file still has the recorded size and the
+recorded last line at the recorded offset; that check costs one small read and,
+unlike mtimes, survives a fresh git checkout. Otherwise callers fall back to
+reading the file itself. Recording a file that only grew by appended lines reads
+just those lines, so keeping the manifest current costs no more than the append.
+For the same reason there is no content hash: keeping one current would mean
+reading the whole file after every append, and the size plus last-line check
+already tells a changed file apart.
+"""
+import json
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+from pricedb import atomic, ledger
+
+MANIFEST_NAME = "manifest.json"
+
+
+class Manifest:
+    """The manifest of one source directory, saved atomically with ``save``."""
+
+    def __init__(self, directory="."):
+        self.path = Path(directory) / MANIFEST_NAME
+        try:
+            self.data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self.data = {}
+        self.data.setdefault("files", {})
+        self.dirty = False
+
+    def get(self, path):
+        """The entry for ``path`` if it still matches the file on disk, else None."""
+        path = Path(path)
+        entry = self.data["files"].get(path.name)
+        if entry is None:
+            return None
+        try:
+            if path.stat().st_size != entry["size"]:
+                return None
+            if entry["size"] == 0:
+                return entry
+            with open(path, "rb") as f:
+                f.seek(entry["last_line_offset"])
+                tail = f.read().decode("utf-8").strip()
+        except (OSError, KeyError, UnicodeDecodeError):
+            return None
+        return entry if tail == entry["last_line"] else None
+
+    def last_date(self, path):
+        """Last price date of a ledger, from the manifest or else the file's tail."""
+        entry = self.get(path)
+        if entry is not None:
+            return date.fromisoformat(entry["last_date"]) if entry["last_date"] else None
+        return ledger.last_date(path)
+
+    def record(self, path, fetched=True, **extra):
+        """Re-index ``path`` after it was written (or confirmed up to date).
+
+        An unchanged file keeps its entry, an appended one is updated from the
+        new lines and anything else is scanned again. ``fetched`` stamps a
+        changed entry with the current time as its last fetch, so a run that
+        changes no data leaves the manifest as it was; ``extra`` keys (e.g.
+        ``last_pay_date``) are stored alongside."""
+        path = Path(path)
+        files = self.data["files"]
+        if not path.exists():
+            self.dirty |= files.pop(path.name, None) is not None
+            return
+        old = files.get(path.name)
+        entry = self.get(path)
+        if entry is None:
+            entry = (old and scan_appended(path, old)) or scan(path)
+            entry = {**(old or {}), **entry}
+            if fetched:
+                now = datetime.now(timezone.utc)
+                entry["last_fetch"] = now.isoformat(timespec="seconds")
+        entry = {**entry, **extra}
+        if entry != old:
+            files[path.name] = entry
+            self.dirty = True
+
+    def save(self):
+        """Write the manifest atomically if anything changed."""
+        if not self.dirty:
+            return
+        self.data["files"] = dict(sorted(self.data["files"].items()))
+        atomic.write_text(self.path, json.dumps(self.data, indent=1) + "\n")
+        self.dirty = False
+
+
+def scan(path):
+    """Build a manifest entry by reading ``path`` once.
+
+    ``rows`` counts price lines of a ledger, or data rows (after the header) of
+    a CSV; only ledgers have first/last dates."""
+    entry = {
+        "first_date": None,
+        "last_date": None,
+        "rows": 0,
+        "size": 0,
+        "last_line_offset": 0,
+        "last_line": "",
+    }
+    with open(path, "rb") as f:
+        return _index(f, 0, Path(path).suffix == ".csv", entry)
+
+
+def scan_appended(path, entry):
+    """``entry`` brought up to date with the lines appended to ``path`` since,
+    reading the file from the recorded last line on.
+
+    None if the file did not grow or no longer has the recorded last line at
+    its offset (then it was rewritten, not appended to)."""
+    try:
+        size, offset = entry["size"], entry["last_line_offset"]
+        if not size or path.stat().st_size <= size:
+            return None
+        with open(path, "rb") as f:
+            f.seek(offset)
+            lines = f.read().splitlines(keepends=True)
+        if lines[0].decode("utf-8").strip() != entry["last_line"]:
+            return None
+    except (OSError, KeyError, IndexError, UnicodeDecodeError):
+        return None
+    is_csv = path.suffix == ".csv"
+    return _index(lines[1:], offset + len(lines[0]), is_csv, dict(entry))
+
+
+def _index(lines, offset, is_csv, entry):
+    """Fold the raw ``lines``, starting at byte ``offset``, into ``entry``."""
+    for raw in lines:
+        line = raw.decode("utf-8").strip()
+        if line:
+            day = None if is_csv else ledger.line_date(line)
+            if day is not None:
+                entry["first_date"] = entry["first_date"] or day.isoformat()
+                entry["last_date"] = day.isoformat()
+            if day is not None or (is_csv and offset > 0):
+                entry["rows"] += 1
+            entry["last_line_offset"], entry["last_line"] = offset, line
+        offset += len(raw)
+    entry["size"] = offset
+    return entry
@@ -0,0 +1,164 @@
+"""Offline trading calendars for the markets the updaters pull from.
+
+``CNB``  -- Czech National Bank fixing: every weekday except Czech public holidays.
+``PSE``  -- Prague Stock Exchange: Czech public holidays, Good Friday (closed since
+            2014, before it became a public holiday) and 31 December.
+``US``   -- NYSE/Nasdaq: the regular NYSE holiday rules, with Saturday holidays
+            observed on Friday and Sunday holidays on Monday.
+
+The updaters use ``new_data_possible`` to skip the network when no observation
+can have been published since a series' last date (weekends, holidays). Past
+one-off US closures are listed; future ones are not known in advance, so the
+calendar reports a trading day and the fetch simply returns nothing new.
+Likewise a day wrongly marked as a holiday only delays its fetch to the next
+trading day, since every updater fetches everything after its last date.
+"""
+from datetime import date, timedelta
+
+CNB = "CNB"
+PSE = "PSE"
+US = "US"
+
+
+def easter_sunday(year):
+    """Gregorian Easter Sunday (anonymous Gregorian algorithm)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def czech_holidays(year):
+    """Czech public holidays (statní svátky and ostatní svátky) of ``year``."""
+    easter = easter_sunday(year)
+    days = {
+        date(year, 1, 1),
+        easter + timedelta(days=1),  # Easter Monday
+        date(year, 5, 1),
+        date(year, 5, 8),
+        date(year, 7, 5),
+        date(year, 7, 6),
+        date(year, 9, 28),
+        date(year, 10, 28),
+        date(year, 11, 17),
+        date(year, 12, 24),
+        date(year, 12, 25),
+        date(year, 12, 26),
+    }
+    if year >= 2016:
+        days.add(easter - timedelta(days=2))  # Good Friday
+    return days
+
+
+def nth_weekday(year, month, weekday, n):
+    """The ``n``-th ``weekday`` (0 = Monday) of a month; ``n=-1`` is the last."""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    next_month = date(year + month // 12, month % 12 + 1, 1)
+    last = next_month - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def observed(day):
+    """NYSE observance: Saturday -> Friday, Sunday -> Monday."""
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+# Unscheduled NYSE closures (national days of mourning, hurricane Sandy).
+US_SPECIAL_CLOSURES = {
+    date(2004, 6, 11),
+    date(2007, 1, 2),
+    date(2012, 10, 29),
+    date(2012, 10, 30),
+    date(2018, 12, 5),
+    date(2025, 1, 9),
+}
+
+
+def us_holidays(year):
+    """NYSE full-day holidays of ``year``."""
+    days = {
+        nth_weekday(year, 1, 0, 3),  # Martin Luther King Jr. Day
+        nth_weekday(year, 2, 0, 3),  # Washington's Birthday
+        easter_sunday(year) - timedelta(days=2),  # Good Friday
+        nth_weekday(year, 5, 0, -1),  # Memorial Day
+        observed(date(year, 7, 4)),
+        nth_weekday(year, 9, 0, 1),  # Labor Day
+        nth_weekday(year, 11, 3, 4),  # Thanksgiving
+        observed(date(year, 12, 25)),
+    }
+    # New Year's Day on a Saturday is not observed on the Friday before (the
+    # exchange keeps its year-end close), so only the Sunday -> Monday shift.
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        days.add(observed(new_year))
+    if year >= 2022:
+        days.add(observed(date(year, 6, 19)))  # Juneteenth
+    days.update(d for d in US_SPECIAL_CLOSURES if d.year == year)
+    return days
+
+
+def pse_holidays(year):
+    """Prague Stock Exchange closing days of ``year``."""
+    days = czech_holidays(year) | {date(year, 12, 31)}
+    if year >= 2014:
+        days.add(easter_sunday(year) - timedelta(days=2))  # Good Friday
+    return days
+
+
+_HOLIDAYS = {
+    CNB: czech_holidays,
+    PSE: pse_holidays,
+    US: us_holidays,
+}
+_cache = {}
+
+
+def holidays(market, year):
+    """Non-weekend closing days of ``market`` in ``year``."""
+    key = (market, year)
+    if key not in _cache:
+        _cache[key] = _HOLIDAYS[market](year)
+    return _cache[key]
+
+
+def is_trading_day(market, day):
+    """True if ``market`` publishes an observation for ``day``."""
+    return day.weekday() < 5 and day not in holidays(market, day.year)
+
+
+def trading_days(market, first, last):
+    """Every trading day of ``market`` from ``first`` to ``last`` inclusive."""
+    days = []
+    day = first
+    while day <= last:
+        if is_trading_day(market, day):
+            days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def new_data_possible(market, last_date, today):
+    """True if ``market`` may have published something after ``last_date``.
+
+    A series with no ``last_date`` always needs fetching."""
+    if last_date is None:
+        return True
+    day = last_date + timedelta(days=1)
+    while day <= today:
+        if is_trading_day(market, day):
+            return True
+        day += timedelta(days=1)
+    return False
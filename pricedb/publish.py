@@ -0,0 +1,211 @@
+"""Distribution artifacts written next to the ledgers: delta feeds and gzip copies.
+
+Every ledger line an updater run adds or changes is also collected in
+``delta/`` of its source directory:
+
+``delta/YYYY-MM-DD.ledger``  the lines of the runs of that day
+``delta/YYYY-MM.ledger``     the lines of every run in that month
+
+so a mirror that synced on some day only needs the day files after it (or the
+month files of a long absence) instead of the full ledgers. A line that
+changed again later in the same day or month replaces its earlier version, so
+each file holds one line per day and commodity. Day files are removed after
+``DELTA_KEEP_DAYS``; month files are kept.
+
+``<name>.ledger.gz`` is a gzip copy of each ledger, for consumers that fetch
+the raw files. It is written without a timestamp, so an unchanged ledger gives
+an identical copy and leaves nothing to commit. Lines appended to a daily
+ledger are added to its copy as a further gzip member (gzip readers decompress
+concatenated members as one stream), so an append does not recompress the
+whole history; a full rewrite of the ledger compresses it again as one member.
+
+Two optional layouts bound what ``ledger`` has to parse at startup:
+
+``<name>/YYYY.ledger``        one shard per year of a daily ledger, with
+``<name>/index.ledger``       including the shards from ``--shard-index-since``
+``pricedb.ledger``            every daily ledger of the directory merged into one
+                              date-sorted file (streaming k-way merge)
+"""
+import gzip
+import heapq
+import io
+from contextlib import ExitStack
+from datetime import date, timedelta
+from pathlib import Path
+
+from pricedb import atomic, ledger
+
+DELTA_DIR = "delta"
+# Day files older than this many days are removed; the month files remain.
+DELTA_KEEP_DAYS = 62
+
+
+def line_key(line):
+    """(date, commodity, currency) of a price line, i.e. what a newer line
+    for the same key replaces."""
+    parts = line.split()
+    return parts[1], parts[2], parts[4]
+
+
+def merge_lines(path, lines):
+    """Merge price ``lines`` into the delta file ``path``, newest line per key."""
+    merged = {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    merged[line_key(line)] = line.rstrip("\n")
+    except FileNotFoundError:
+        pass
+    for line in lines:
+        merged[line_key(line)] = line
+    atomic.write_lines(path, (merged[k] for k in sorted(merged)))
+
+
+class DeltaLog:
+    """The lines added or changed by one run in ``directory``, saved to its
+    day and month delta files by ``save``."""
+
+    def __init__(self, directory=".", today=None):
+        self.directory = Path(directory) / DELTA_DIR
+        self.today = today or date.today()
+        self.lines = []
+        self.saved = 0
+
+    def add(self, lines):
+        """Record price ``lines`` written in this run."""
+        self.lines.extend(lines)
+
+    def save(self):
+        """Merge the lines recorded since the last save into the delta files."""
+        lines = self.lines[self.saved:]
+        if lines:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            merge_lines(self.directory / f"{self.today:%Y-%m-%d}.ledger", lines)
+            merge_lines(self.directory / f"{self.today:%Y-%m}.ledger", lines)
+            self.saved = len(self.lines)
+        self.prune()
+
+    def prune(self):
+        """Remove day files older than DELTA_KEEP_DAYS."""
+        oldest = f"{self.today - timedelta(days=DELTA_KEEP_DAYS):%Y-%m-%d}"
+        for path in self.directory.glob("????-??-??.ledger"):
+            if path.stem < oldest:
+                path.unlink()
+
+
+def gzip_copy(path):
+    """Write ``<path>.gz``, a reproducible gzip copy of ``path``; True if it changed."""
+    path = Path(path)
+    buf = io.BytesIO()
+    with gzip.GzipFile(filename="", mode="wb", fileobj=buf, mtime=0) as f:
+        f.write(path.read_bytes())
+    return atomic.write_bytes(path.with_name(path.name + ".gz"), [buf.getvalue()])
+
+
+def gzip_append(path, text):
+    """Extend the gzip copy of ``path`` by ``text`` just appended to ``path``.
+
+    A missing copy is written in full instead."""
+    path = Path(path)
+    gz_path = path.with_name(path.name + ".gz")
+    if not gz_path.exists():
+        gzip_copy(path)
+        return
+    with open(gz_path, "ab") as f:
+        f.write(gzip.compress(text.encode("utf-8"), mtime=0))
+
+
+SHARD_INDEX = "index.ledger"
+SHARD_GLOB = "[0-9][0-9][0-9][0-9].ledger"
+CONSOLIDATED = "pricedb.ledger"
+
+
+class YearShards:
+    """Per-year shards of a daily ledger in its own directory, and an index
+    including those from year ``since`` on (every year when None)."""
+
+    def __init__(self, since=None):
+        self.since = since
+
+    def render(self, directory, rows, format_line):
+        """Rewrite the shards of every (date, value) row; drop other years."""
+        years = {}
+        for row in rows:
+            years.setdefault(row[0].year, []).append(format_line(*row))
+        directory.mkdir(parents=True, exist_ok=True)
+        for year, lines in years.items():
+            atomic.write_lines(directory / f"{year}.ledger", lines)
+        for path in directory.glob(SHARD_GLOB):
+            if int(path.stem) not in years:
+                path.unlink()
+        self.write_index(directory)
+
+    def append(self, directory, rows, format_line):
+        """Append new (date, value) ``rows`` to the shards of their years."""
+        years = {}
+        for row in rows:
+            years.setdefault(row[0].year, []).append(format_line(*row))
+        for year, lines in years.items():
+            ledger.append_lines(directory / f"{year}.ledger", lines)
+        self.write_index(directory)
+
+    def write_index(self, directory):
+        """Write the index including the shards from ``since`` on."""
+        years = sorted(int(path.stem) for path in directory.glob(SHARD_GLOB))
+        atomic.write_lines(
+            directory / SHARD_INDEX,
+            (
+                f"include {year}.ledger"
+                for year in years
+                if self.since is None or year >= self.since
+            ),
+        )
+
+
+def consolidate(directory="."):
+    """Merge every daily ledger in ``directory`` into its date-sorted
+    ``pricedb.ledger``; True if that changed.
+
+    The ledgers are merged as streams (``heapq.merge`` over the open files), so
+    only one line per ledger is held in memory. Lines of the same day follow
+    the ledgers' name order."""
+    path = Path(directory) / CONSOLIDATED
+    writer = atomic.AtomicFile(path)
+    with ExitStack() as stack, writer as out:
+        files = [
+            stack.enter_context(open(p, encoding="utf-8"))
+            for p in ledger.series_paths(directory)
+        ]
+        for line in heapq.merge(*files, key=lambda line: line[2:12]):
+            if line.strip():
+                out.write(line if line.endswith("\n") else line + "\n")
+    if writer.changed or not path.with_name(path.name + ".gz").exists():
+        gzip_copy(path)
+    return writer.changed
+
+
+def add_arguments(parser):
+    """Add the optional output layouts to an updater's argument parser."""
+    parser.add_argument(
+        "--year-shards",
+        action="store_true",
+        help="Also write every daily ledger as <name>/YYYY.ledger shards with a "
+        "<name>/index.ledger including them",
+    )
+    parser.add_argument(
+        "--shard-index-since",
+        type=int,
+        metavar="YEAR",
+        help="Include only the shards from YEAR on in each index.ledger",
+    )
+    parser.add_argument(
+        "--consolidate",
+        action="store_true",
+        help=f"Also merge every daily ledger of the directory into {CONSOLIDATED}",
+    )
+
+
+def shards_from_args(args):
+    """The ``YearShards`` to write per the parsed options, or None."""
+    return YearShards(args.shard_index_since) if args.year_shards else None
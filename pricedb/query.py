@@ -0,0 +1,219 @@
+"""Point-in-time price lookups over the generated data, for use as a library.
+
+    from pricedb.query import PriceDB
+
+    db = PriceDB()                              # the tree this package lives in
+    db.price("USDCZK", date(2024, 3, 9))        # last fixing on or before
+    db.prices("USDCZK", days)                   # one series, many dates
+    db.prices(["USDCZK", "AAPL"], [day1, day2]) # pairwise
+
+A series is named by its ledger's file stem (``USDCZK``, ``AAPL``, ``SPYd``,
+``BAACEZ``); ``resolve`` also finds it by commodity (``USD``, with ``CZK``
+implied when it is the only currency). Opening a ``PriceDB`` only lists the
+ledger files; a series is loaded the first time it is looked up -- mapped from
+its ``store/<name>.*`` files (see ``pricedb.store``), or parsed from the
+ledger when there is no current store file -- and kept in an LRU bounded by
+``max_bytes``. ``refresh`` picks up what an updater run changed since.
+"""
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+
+from pricedb import formats, ledger, store
+
+# Default bound of the loaded series' columns.
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# Bytes per row: an int32 day number and a float64 value.
+ROW_BYTES = 12
+
+
+def default_root():
+    """The tree holding ``currency/`` and ``stocks/`` next to this package."""
+    return Path(__file__).resolve().parents[1]
+
+
+def file_stamp(path):
+    """(size, mtime_ns) of ``path``, or None if it does not exist."""
+    try:
+        st = Path(path).stat()
+    except FileNotFoundError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def load_series(directory, name):
+    """The columns of series ``name`` in ``directory``.
+
+    The store file is used when it ends on the same day as the ledger; otherwise
+    the ledger is parsed (a store is never written here)."""
+    directory = Path(directory)
+    ledger_path = directory / f"{name}.ledger"
+    try:
+        columns = store.read(directory / store.STORE_DIR / name)
+    except ValueError:
+        columns = None
+    if columns is not None and columns.last_date() == ledger.last_date(ledger_path):
+        return columns
+
+    days, values = array("i"), array("d")
+    with open(ledger_path, encoding="utf-8") as f:
+        for day, value in sorted(formats.ledger_prices(f), key=lambda r: r[0]):
+            days.append(store.day_number(day))
+            values.append(value)
+    return store.Columns(None, days, values)
+
+
+class PriceDB:
+    """As-of lookups over every series under ``root``.
+
+    If two source directories have a series of the same name, the one in the
+    first directory (in path order) wins; pass ``directories`` to choose."""
+
+    def __init__(self, root=None, directories=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = Path(root) if root is not None else default_root()
+        self.directories = directories
+        self.max_bytes = max_bytes
+        self._loaded = OrderedDict()
+        self._stamps = {}
+        self._bytes = 0
+        self._commodities = None
+        self._scan()
+
+    def _scan(self):
+        """List the series in the source directories."""
+        directories = self.directories
+        if directories is None:
+            directories = sorted(
+                {p.parent for p in self.root.rglob("*-monthly.ledger")}
+            )
+        self.paths = {}
+        for directory in directories:
+            for path in ledger.series_paths(directory):
+                self.paths.setdefault(path.stem, path.parent)
+
+    def _stamp(self, name):
+        """What identifies the current content of series ``name`` on disk."""
+        directory = self.paths[name]
+        # Every store write or append ends by rewriting its JSON file.
+        meta_path = store.files(directory / store.STORE_DIR / name)[0]
+        return file_stamp(directory / f"{name}.ledger"), file_stamp(meta_path)
+
+    def names(self):
+        """Names of every series available."""
+        return sorted(self.paths)
+
+    def commodities(self):
+        """{(commodity, currency): name} of every series, read from the last
+        line of each ledger (once; ``refresh`` re-reads it)."""
+        if self._commodities is None:
+            self._commodities = {}
+            for name, directory in self.paths.items():
+                tail = ledger.tail_lines(directory / f"{name}.ledger", 1)
+                parts = tail[0][1].split() if tail else []
+                if len(parts) >= 5:
+                    self._commodities.setdefault((parts[2], parts[4]), name)
+        return self._commodities
+
+    def resolve(self, commodity, currency=None):
+        """The series name of ``commodity`` priced in ``currency``.
+
+        ``commodity`` may be a series name itself; without ``currency`` the
+        commodity must be priced in a single currency."""
+        if currency is None and commodity in self.paths:
+            return commodity
+        matches = [
+            name
+            for (c, cur), name in self.commodities().items()
+            if c == commodity and currency in (None, cur)
+        ]
+        if not matches:
+            raise KeyError(f"no price series for {commodity!r}")
+        if len(matches) > 1:
+            raise KeyError(f"{commodity!r} has several currencies; pass one")
+        return matches[0]
+
+    def refresh(self):
+        """Re-list the series and reload the loaded ones whose files changed.
+
+        Returns the names reloaded; series gone from disk are dropped."""
+        self._scan()
+        self._commodities = None
+        reloaded = []
+        for name in list(self._loaded):
+            if name in self.paths and self._stamps[name] == self._stamp(name):
+                continue
+            self._bytes -= ROW_BYTES * len(self._loaded.pop(name))
+            del self._stamps[name]
+            if name in self.paths:
+                self.series(name)
+                reloaded.append(name)
+        return reloaded
+
+    def series(self, name):
+        """The columns of series ``name``, loading it (and evicting least
+        recently used series past ``max_bytes``) if needed."""
+        columns = self._loaded.get(name)
+        if columns is not None:
+            self._loaded.move_to_end(name)
+            return columns
+        if name not in self.paths:
+            raise KeyError(f"no price series {name!r}")
+        stamp = self._stamp(name)
+        columns = load_series(self.paths[name], name)
+        self._loaded[name] = columns
+        self._stamps[name] = stamp
+        self._bytes += ROW_BYTES * len(columns)
+        # The series just loaded stays, even if it alone exceeds the bound.
+        while self._bytes > self.max_bytes and len(self._loaded) > 1:
+            evicted_name, evicted = self._loaded.popitem(last=False)
+            del self._stamps[evicted_name]
+            self._bytes -= ROW_BYTES * len(evicted)
+        return columns
+
+    def price(self, name, day):
+        """Price of ``name`` on ``day`` or the last day before it; None if the
+        series starts later."""
+        columns = self.series(name)
+        i = columns.as_of(day)
+        return columns.values[i] if i >= 0 else None
+
+    def price_row(self, name, day):
+        """Like ``price`` but as (date of the price, price), or None."""
+        columns = self.series(name)
+        i = columns.as_of(day)
+        if i < 0:
+            return None
+        return store.dated(columns.days[i:i + 1], columns.values[i:i + 1])[0]
+
+    def price_range(self, name, first, last):
+        """[(date, price)] of ``name`` from ``first`` to ``last`` inclusive."""
+        columns = self.series(name)
+        start, end = columns.index(first), columns.as_of(last) + 1
+        return store.dated(columns.days[start:end], columns.values[start:end])
+
+    def prices(self, names, days):
+        """As-of prices for many lookups at once, as an ``array('d')``.
+
+        ``names`` is one series name for all ``days`` or a sequence pairing a
+        name with each day. Lookups with no price on or before their day give
+        NaN. The lookups are grouped by series, so every series is loaded once."""
+        days = list(days)
+        if isinstance(names, str):
+            groups = {names: range(len(days))}
+        else:
+            names = list(names)
+            if len(names) != len(days):
+                raise ValueError("names and days differ in length")
+            groups = {}
+            for i, name in enumerate(names):
+                groups.setdefault(name, []).append(i)
+
+        out = array("d", [float("nan")]) * len(days)
+        for name, indices in groups.items():
+            columns = self.series(name)
+            values = columns.values
+            for i in indices:
+                j = columns.as_of(days[i])
+                if j >= 0:
+                    out[i] = values[j]
+        return out
@@ -0,0 +1,98 @@
+"""Rolling-window rate limiter whose state is shared on disk between processes.
+
+An API quota like "5 requests per rolling minute" applies to the account, not to
+one process. The limiter therefore keeps the timestamps of recent calls in a small
+JSON file, guarded by an exclusive ``flock``, so consecutive runs and runs in
+parallel (a manual ``--ticker`` rerun next to the CI job) see the same window.
+
+Calls go out in a burst until the window is full; only then does ``acquire``
+sleep, and only until the oldest call drops out of the window. When the server
+still answers 429, ``penalize`` blocks the whole window (or the server's
+``Retry-After``) for every process sharing the file.
+"""
+import fcntl
+import json
+import os
+import time
+
+from pricedb.cache import cache_root
+
+# Added to the window so clock skew with the server does not trip the limit.
+SAFETY_MARGIN = 1.0
+
+
+def parse_rate_limit(value):
+    """Parse 'CALLS/SECONDS' (e.g. '5/60') into (calls, seconds); '0' means unlimited."""
+    if value in ("0", "", None):
+        return None
+    try:
+        calls, seconds = value.split("/")
+        calls, seconds = int(calls), float(seconds)
+    except ValueError:
+        raise ValueError(f"invalid rate limit {value!r}; expected CALLS/SECONDS")
+    if calls <= 0 or seconds <= 0:
+        raise ValueError(f"invalid rate limit {value!r}; expected positive numbers")
+    return calls, seconds
+
+
+def default_state_path(name):
+    """Where the shared window of the ``name`` API is kept."""
+    return cache_root() / f"{name}-ratelimit.json"
+
+
+class RateLimiter:
+    """At most ``calls`` requests per rolling ``seconds``, shared via ``path``."""
+
+    def __init__(self, path, calls, seconds):
+        self.path = path
+        self.calls = calls
+        self.window = seconds + SAFETY_MARGIN
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def _update(self, fn):
+        """Run ``fn(state, now)`` under the file lock and persist its changes."""
+        with open(self.path, "a+", encoding="utf-8") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read() or "{}")
+                except ValueError:
+                    state = {}
+                now = time.time()
+                state["calls"] = [t for t in state.get("calls", []) if t > now - self.window]
+                state.setdefault("blocked_until", 0.0)
+                result = fn(state, now)
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+                os.fsync(f.fileno())
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return result
+
+    def acquire(self):
+        """Block until a call is allowed, then record it."""
+        def take(state, now):
+            calls = state["calls"]
+            wait = state["blocked_until"] - now
+            if len(calls) >= self.calls:
+                wait = max(wait, calls[-self.calls] + self.window - now)
+            if wait <= 0:
+                calls.append(now)
+            return wait
+
+        while True:
+            wait = self._update(take)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def penalize(self, retry_after=None):
+        """Server said 429: block every process for ``retry_after`` or a full window."""
+        def block(state, now):
+            delay = self.window if retry_after is None else retry_after
+            state["blocked_until"] = max(state["blocked_until"], now + delay)
+
+        self._update(block)
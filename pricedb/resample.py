@@ -0,0 +1,94 @@
+"""Coarser price series from a daily one, for any set of granularities in one pass.
+
+A granularity is a period (week, month, quarter, year) and an anchor: the first
+or the last trading day of each period. The daily series is walked once and
+every requested granularity is collected along the way; ``<name>-<granularity>
+.ledger`` files are rendered from the result.
+
+``monthly`` (first trading day of each month) is what every updater has always
+published. A "first" series also gets, with ``latest_line``, a trailing line
+for the latest day when that is not itself a period's first, so the latest
+price is present mid-period. A "last" series ends with the latest day anyway
+(the last day so far of the current period).
+"""
+# Period key of a date, per period.
+PERIODS = {
+    "week": lambda d: d.isocalendar()[:2],
+    "month": lambda d: (d.year, d.month),
+    "quarter": lambda d: (d.year, (d.month - 1) // 3),
+    "year": lambda d: d.year,
+}
+
+# Granularity name -> (period, anchor); the name is the ledger file suffix.
+GRANULARITIES = {
+    "weekly": ("week", "first"),
+    "monthly": ("month", "first"),
+    "quarterly": ("quarter", "first"),
+    "yearly": ("year", "first"),
+    "week-end": ("week", "last"),
+    "month-end": ("month", "last"),
+    "quarter-end": ("quarter", "last"),
+    "year-end": ("year", "last"),
+}
+
+# Published by every updater whatever else is configured.
+DEFAULT = ("monthly",)
+
+
+def period_key(name):
+    """The period-key function of granularity ``name``."""
+    return PERIODS[GRANULARITIES[name][0]]
+
+
+def anchor(name):
+    """"first" or "last": which day of each period granularity ``name`` keeps."""
+    return GRANULARITIES[name][1]
+
+
+def resample(rows, names, latest_line=True):
+    """{name: [(date, value)]} for each granularity in ``names``, from sorted
+    (date, value) ``rows`` in a single pass."""
+    keys = [period_key(name) for name in names]
+    firsts = [anchor(name) == "first" for name in names]
+    out = [[] for _name in names]
+    current = [None] * len(names)
+    opened = [False] * len(names)
+    last = None
+    for row in rows:
+        day = row[0]
+        for i, key in enumerate(keys):
+            k = key(day)
+            opened[i] = k != current[i]
+            if opened[i]:
+                current[i] = k
+                if firsts[i]:
+                    out[i].append(row)
+                elif last is not None:
+                    out[i].append(last)  # the closed period's last day
+        last = row
+    if last is not None:
+        for i, first in enumerate(firsts):
+            if not first or (latest_line and not opened[i]):
+                out[i].append(last)
+    return dict(zip(names, out))
+
+
+def add_arguments(parser):
+    """Add the ``--resample`` option to an updater's argument parser."""
+    parser.add_argument(
+        "--resample",
+        default="",
+        help="Comma-separated coarser files to write besides <name>-monthly.ledger: "
+        + ", ".join(name for name in GRANULARITIES if name not in DEFAULT),
+    )
+
+
+def from_args(args):
+    """The granularities to write, from the parsed ``--resample`` option."""
+    names = list(DEFAULT)
+    for name in filter(None, (n.strip() for n in args.resample.split(","))):
+        if name not in GRANULARITIES:
+            raise ValueError(f"unknown granularity {name!r} in --resample")
+        if name not in names:
+            names.append(name)
+    return tuple(names)
@@ -0,0 +1,255 @@
+"""Local HTTP price-query service over a ``PriceDB``.
+
+    python -m pricedb.server [--root DIR] [--host 127.0.0.1] [--port 8765]
+
+Every series is loaded once at startup (mapped from the store files where they
+exist) and answered from memory; a background task calls ``PriceDB.refresh``
+every ``--reload-interval`` seconds, so only the series an updater run changed
+are reloaded. All answers are JSON:
+
+``GET /rate?commodity=USD&date=2024-03-01[&currency=CZK]``
+    The price on that date or the last one before it.
+``POST /rates`` with ``[{"commodity": ..., "date": ..., "currency": ...}, ...]``
+    Many lookups at once; the answer lists one result per lookup, in order.
+``GET /range?commodity=USD&from=2024-01-01&to=2024-03-31[&currency=CZK]``
+    Every price in the range.
+``GET /series``
+    The names of the series served.
+
+``commodity`` may also be a series name (``USDCZK``, ``SPYd``). The service
+speaks just enough HTTP/1.1 (keep-alive, ``Content-Length`` bodies) for local
+clients; put a real web server in front of it before exposing it.
+"""
+import argparse
+import asyncio
+import json
+import traceback
+from datetime import date
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from pricedb.query import PriceDB
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_RELOAD_INTERVAL = 30.0
+# Largest request body accepted (a batch of roughly 100k lookups).
+MAX_BODY_BYTES = 8 * 1024 * 1024
+
+
+class RequestError(Exception):
+    """A request that cannot be answered, with the HTTP status to reply with."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_date(value, field="date"):
+    """Parse a YYYY-MM-DD query value."""
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"{field}: expected YYYY-MM-DD")
+
+
+class PriceService:
+    """Answers the service's requests from ``db``."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def _series(self, commodity, currency=None):
+        if not commodity:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "commodity is required")
+        if not isinstance(commodity, str):
+            raise RequestError(HTTPStatus.BAD_REQUEST, "commodity: expected a string")
+        if currency is not None and not isinstance(currency, str):
+            raise RequestError(HTTPStatus.BAD_REQUEST, "currency: expected a string")
+        try:
+            return self.db.resolve(commodity, currency)
+        except KeyError as e:
+            raise RequestError(HTTPStatus.NOT_FOUND, e.args[0])
+
+    def rate(self, commodity, day, currency=None):
+        """The answer of one as-of lookup."""
+        name = self._series(commodity, currency)
+        row = self.db.price_row(name, parse_date(day))
+        return {
+            "series": name,
+            "date": day,
+            "price_date": row[0].isoformat() if row else None,
+            "price": row[1] if row else None,
+        }
+
+    def rates(self, lookups):
+        """The answers of a batch of lookups; a bad one gets an ``error``."""
+        if not isinstance(lookups, list):
+            raise RequestError(HTTPStatus.BAD_REQUEST, "expected a JSON list")
+        results = []
+        for lookup in lookups:
+            try:
+                if not isinstance(lookup, dict):
+                    raise RequestError(HTTPStatus.BAD_REQUEST, "expected an object")
+                results.append(
+                    self.rate(
+                        lookup.get("commodity"), lookup.get("date"),
+                        lookup.get("currency"),
+                    )
+                )
+            except RequestError as e:
+                results.append({"error": str(e)})
+        return results
+
+    def range(self, commodity, first, last, currency=None):
+        """Every price of one series between two dates."""
+        name = self._series(commodity, currency)
+        rows = self.db.price_range(
+            name, parse_date(first, "from"), parse_date(last, "to")
+        )
+        return {"series": name, "prices": [[d.isoformat(), p] for d, p in rows]}
+
+    def handle(self, method, target, body):
+        """Dispatch one request; returns (status, JSON-ready payload)."""
+        url = urlsplit(target)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        currency = query.get("currency")
+        try:
+            if method == "GET" and url.path == "/rate":
+                return HTTPStatus.OK, self.rate(
+                    query.get("commodity"), query.get("date"), currency
+                )
+            if method == "POST" and url.path == "/rates":
+                try:
+                    lookups = json.loads(body)
+                except ValueError:
+                    raise RequestError(HTTPStatus.BAD_REQUEST, "body is not JSON")
+                return HTTPStatus.OK, self.rates(lookups)
+            if method == "GET" and url.path == "/range":
+                return HTTPStatus.OK, self.range(
+                    query.get("commodity"), query.get("from"), query.get("to"),
+                    currency,
+                )
+            if method == "GET" and url.path == "/series":
+                return HTTPStatus.OK, self.db.names()
+            raise RequestError(HTTPStatus.NOT_FOUND, f"no endpoint {method} {url.path}")
+        except RequestError as e:
+            return e.status, {"error": str(e)}
+        except Exception:
+            print(f"Error answering {method} {target}:")
+            traceback.print_exc()
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "internal error"}
+
+    @staticmethod
+    async def read_body(reader, headers):
+        """The request body announced by ``Content-Length``."""
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise RequestError(
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "request body too large"
+            )
+        return await reader.readexactly(length) if length else b""
+
+    async def serve_connection(self, reader, writer):
+        """Answer the requests of one (keep-alive) connection."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                try:
+                    body = await self.read_body(reader, headers)
+                except RequestError as e:
+                    # The body was not read, so the connection cannot go on.
+                    status, payload = e.status, {"error": str(e)}
+                    keep_alive = False
+                else:
+                    status, payload = self.handle(method, target, body)
+                    connection = headers.get("connection", "").lower()
+                    keep_alive = connection != "close" and (
+                        version == "HTTP/1.1" or connection == "keep-alive"
+                    )
+                data = json.dumps(payload).encode("utf-8")
+                writer.write(
+                    (
+                        f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                        "Content-Type: application/json\r\n"
+                        f"Content-Length: {len(data)}\r\n"
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+                        "\r\n"
+                    ).encode("latin-1")
+                    + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def reload_loop(self, interval):
+        """Reload the series whose files changed, every ``interval`` seconds."""
+        while True:
+            await asyncio.sleep(interval)
+            reloaded = self.db.refresh()
+            if reloaded:
+                print(f"Reloaded {len(reloaded)} series: {', '.join(reloaded)}")
+
+
+async def serve(service, host, port, reload_interval):
+    server = await asyncio.start_server(service.serve_connection, host, port)
+    print(f"Serving {len(service.db.names())} series on http://{host}:{port}")
+    reloader = asyncio.create_task(service.reload_loop(reload_interval))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        reloader.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve as-of price lookups over the generated ledgers."
+    )
+    parser.add_argument(
+        "--root",
+        help="Tree holding the currency/ and stocks/ directories "
+        "(default: the one this package lives in)",
+    )
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Address to bind")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to bind")
+    parser.add_argument(
+        "--reload-interval",
+        type=float,
+        default=DEFAULT_RELOAD_INTERVAL,
+        help="Seconds between checks for changed series "
+        f"(default {DEFAULT_RELOAD_INTERVAL:g})",
+    )
+    args = parser.parse_args()
+
+    # No eviction: the service keeps every series in memory.
+    db = PriceDB(args.root, max_bytes=float("inf"))
+    for name in db.names():
+        db.series(name)
+    try:
+        asyncio.run(serve(PriceService(db), args.host, args.port, args.reload_interval))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
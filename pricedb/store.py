@@ -0,0 +1,417 @@
+"""Columnar binary price store the ledger files are rendered from.
+
+Every price series an updater maintains is kept in ``store/`` next to its
+ledgers. The updaters write new prices there first and then render (or append
+to) ``<name>.ledger``, ``<name>-monthly.ledger`` and any other resampled ledgers
+(see ``pricedb.resample``) from the same rows. Readers that only need the
+numbers use the columns directly instead of parsing the ledger text.
+
+A series is three files (all integers little-endian)::
+
+    <name>.days    magic b"PDBDAYS1", generation uint64, then int32 days since
+                   1970-01-01, ascending
+    <name>.values  magic b"PDBVALS1", generation uint64, then float64 prices,
+                   rounded to ``digits`` decimals
+    <name>.json    {"count": rows, "generation": ..., "meta": {commodity,
+                   currency, spec, digits, latest_line}}
+
+New rows are appended to the two column files in place and the small JSON file
+is rewritten last, so an update costs the new rows, not the history. Rows past
+``count`` (left by an interrupted append) are ignored and dropped by the next
+append. A full rewrite gives the columns a new generation, so a reader never
+pairs the columns of two different writes.
+
+Values are stored already rounded the way the ledger prints them, so the store
+and the ledger always agree. The columns can be mapped without copying, e.g.
+``numpy.memmap("<name>.days", "<i4", "r", 16, (count,))`` (and
+``.view("datetime64[D]")``) or ``numpy.memmap("<name>.values", "<f8", "r", 16,
+(count,))``. The stdlib reader below maps them with ``mmap`` and ``memoryview``.
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+from pathlib import Path
+
+from pricedb import atomic, formats, ledger, publish, resample
+
+DAYS_MAGIC = b"PDBDAYS1"
+VALUES_MAGIC = b"PDBVALS1"
+# Column file header: magic and generation; the data after it is 8-byte aligned.
+COLUMN_HEADER = struct.Struct("<8sQ")
+# Subdirectory of a source directory holding its store files.
+STORE_DIR = "store"
+META_SUFFIX = ".json"
+DAYS_SUFFIX = ".days"
+VALUES_SUFFIX = ".values"
+
+
+def day_number(day):
+    """Days since 1970-01-01 of a date."""
+    return day.toordinal() - formats.EPOCH_ORDINAL
+
+
+def dated(days, values):
+    """[(date, value)] from a day-number and a value column."""
+    epoch = formats.EPOCH_ORDINAL
+    return [(date.fromordinal(epoch + d), v) for d, v in zip(days, values)]
+
+
+def files(base):
+    """(meta, days, values) paths of the store ``base`` (``store/<name>``)."""
+    base = str(base)
+    return (
+        Path(base + META_SUFFIX),
+        Path(base + DAYS_SUFFIX),
+        Path(base + VALUES_SUFFIX),
+    )
+
+
+class Columns:
+    """Read-only columns of one stored series: ``days`` (int32) and ``values``
+    (float64), as memoryviews over the mapped files on little-endian hosts."""
+
+    def __init__(self, meta, days, values):
+        self.meta = meta
+        self.days = days
+        self.values = values
+
+    def __len__(self):
+        return len(self.days)
+
+    def last_date(self):
+        """Date of the last row, or None if there are none."""
+        if not len(self.days):
+            return None
+        return date.fromordinal(formats.EPOCH_ORDINAL + self.days[-1])
+
+    def index(self, day):
+        """Index of the first row dated ``day`` or later."""
+        return bisect_left(self.days, day_number(day))
+
+    def as_of(self, day):
+        """Index of the last row dated ``day`` or earlier; -1 if there is none."""
+        return bisect_right(self.days, day_number(day)) - 1
+
+    def rows(self, start=0):
+        """[(date, value)] from row ``start`` on."""
+        return dated(self.days[start:], self.values[start:])
+
+
+def _state(meta_path):
+    """The parsed JSON file of a store; None if it does not exist."""
+    try:
+        state = json.loads(meta_path.read_bytes())
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        state = None
+    if (
+        not isinstance(state, dict)
+        or not isinstance(state.get("count"), int)
+        or not isinstance(state.get("generation"), int)
+        or not isinstance(state.get("meta"), dict)
+    ):
+        raise ValueError(f"{meta_path}: not a price store file")
+    return state
+
+
+def _map(path, magic, generation, size):
+    """Map the first ``size`` data bytes of a column file, checking its header."""
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        raise ValueError(f"{path}: missing store column") from None
+    with f:
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            raise ValueError(f"{path}: not a store column") from None
+    header = COLUMN_HEADER.size
+    if len(buf) < header + size or COLUMN_HEADER.unpack_from(buf) != (
+        magic, generation
+    ):
+        raise ValueError(f"{path}: not a column of this store")
+    return memoryview(buf)[header:header + size]
+
+
+def read(base):
+    """Map the store ``base`` (``store/<name>``); None if it does not exist.
+
+    Raises ValueError if it is incomplete or its files do not belong together."""
+    meta_path, days_path, values_path = files(base)
+    state = _state(meta_path)
+    if state is None:
+        return None
+    count, generation = state["count"], state["generation"]
+    days = _map(days_path, DAYS_MAGIC, generation, 4 * count).cast("i")
+    values = _map(values_path, VALUES_MAGIC, generation, 8 * count).cast("d")
+    if sys.byteorder != "little":
+        days, values = _swapped(days, "i"), _swapped(values, "d")
+    return Columns(state["meta"], days, values)
+
+
+def _swapped(column, typecode):
+    """A byte-swapped copy of ``column`` (little- <-> big-endian)."""
+    column = array(typecode, column.tobytes())
+    column.byteswap()
+    return column
+
+
+def _little_endian(column, typecode):
+    """The bytes of ``column`` as stored: little-endian ``typecode`` items."""
+    if sys.byteorder != "little":
+        column = _swapped(column, typecode)
+    return column.tobytes()
+
+
+def write(base, meta, days, values):
+    """Write the ``days``/``values`` arrays as the whole store ``base``.
+
+    Returns True if it changed; an identical store is left untouched."""
+    meta_path, days_path, values_path = files(base)
+    try:
+        state = _state(meta_path)
+        old = read(base)
+    except ValueError:
+        state = old = None
+    if old is not None and (old.meta, old.days, old.values) == (meta, days, values):
+        return False
+    generation = state["generation"] + 1 if state is not None else 1
+    meta_path.parent.mkdir(parents=True, exist_ok=True)
+    for path, magic, column, typecode in (
+        (days_path, DAYS_MAGIC, days, "i"),
+        (values_path, VALUES_MAGIC, values, "d"),
+    ):
+        atomic.write_bytes(
+            path,
+            [COLUMN_HEADER.pack(magic, generation), _little_endian(column, typecode)],
+        )
+    state = {"count": len(days), "generation": generation, "meta": meta}
+    atomic.write_text(meta_path, json.dumps(state, sort_keys=True))
+    return True
+
+
+def append(base, days, values):
+    """Append the ``days``/``values`` rows to the store ``base`` in place.
+
+    Only the new rows are written: the columns are extended and the JSON file
+    with the new count is rewritten last."""
+    meta_path, days_path, values_path = files(base)
+    if read(base) is None:  # also checks the store is consistent
+        raise ValueError(f"{meta_path}: no price store to append to")
+    state = _state(meta_path)
+    count = state["count"]
+    for path, column, typecode in (
+        (days_path, days, "i"),
+        (values_path, values, "d"),
+    ):
+        with open(path, "r+b") as f:
+            # Drop rows an interrupted append may have left past ``count``.
+            f.truncate(COLUMN_HEADER.size + column.itemsize * count)
+            f.seek(0, os.SEEK_END)
+            f.write(_little_endian(column, typecode))
+    state["count"] = count + len(days)
+    atomic.write_text(meta_path, json.dumps(state, sort_keys=True))
+
+
+class PriceSeries:
+    """One price series: its store file and the ledgers rendered from it.
+
+    Those are <name>.ledger and a <name>-<granularity>.ledger for each of
+    ``granularities`` (see ``pricedb.resample``; "monthly" is always among
+    them). ``spec`` formats a value in the ledger ("" gives ``str(value)``) and
+    ``digits`` is the rounding applied before storing, matching ``spec``.
+    ``latest_line`` is passed on to ``resample.resample``. Every ledger gets a
+    gzip copy, and the daily lines added or changed are recorded in ``delta``
+    (a ``publish.DeltaLog``) when given. With ``shards`` (a
+    ``publish.YearShards``) the daily ledger is also split by year into the
+    directory <name>/."""
+
+    def __init__(self, name, commodity, currency, spec=".2f", digits=2,
+                 latest_line=True, directory=".", delta=None,
+                 granularities=resample.DEFAULT, shards=None):
+        directory = Path(directory)
+        self.name = name
+        self.delta = delta
+        self.shards = shards
+        self.shard_dir = directory / name
+        self.path = directory / STORE_DIR / name
+        self.ledger_path = directory / f"{name}.ledger"
+        self.resampled_paths = {
+            g: directory / f"{name}-{g}.ledger"
+            for g in dict.fromkeys(resample.DEFAULT + tuple(granularities))
+        }
+        self.monthly_path = self.resampled_paths["monthly"]
+        self.meta = {
+            "commodity": commodity,
+            "currency": currency,
+            "spec": spec,
+            "digits": digits,
+            "latest_line": latest_line,
+        }
+
+    def line(self, day, value):
+        """The ledger line of one row."""
+        meta = self.meta
+        return formats.price_line(
+            day, meta["commodity"], value, meta["currency"], meta["spec"]
+        )
+
+    def _columns(self, rows):
+        """(days, values) arrays of (date, value) ``rows``, values rounded."""
+        digits = self.meta["digits"]
+        days, values = array("i"), array("d")
+        for day, value in rows:
+            days.append(day_number(day))
+            values.append(round(value, digits))
+        return days, values
+
+    def load(self):
+        """The stored columns, or None if the series has no data yet.
+
+        A series that only has its ledger (written before the store existed, or
+        with a damaged store file) is read from the ledger once and stored."""
+        try:
+            columns = read(self.path)
+        except ValueError:
+            columns = None
+        if columns is None and self.ledger_path.exists():
+            with open(self.ledger_path, encoding="utf-8") as f:
+                rows = sorted(formats.ledger_prices(f), key=lambda r: r[0])
+            write(self.path, self.meta, *self._columns(rows))
+            columns = read(self.path)
+        return columns
+
+    def rows(self):
+        """Every stored (date, value) row, oldest first."""
+        columns = self.load()
+        return columns.rows() if columns is not None else []
+
+    def write(self, rows):
+        """Store ``rows`` as the whole series and render every ledger from them.
+
+        Returns True if any file changed."""
+        days, values = self._columns(rows)
+        if self.delta is not None:
+            old = self.load()
+            previous = {} if old is None else dict(zip(old.days, old.values))
+            self.delta.add(
+                self.line(*row)
+                for row, d, v in zip(dated(days, values), days, values)
+                if previous.get(d) != v
+            )
+        changed = write(self.path, self.meta, days, values)
+        return self._render(days, values) or changed
+
+    def sync(self, rows):
+        """Store ``rows`` as the whole series, like ``write``, but append in place
+        when the stored rows (with the same meta) are the start of them.
+
+        For series derived anew every run. Returns True if any file changed."""
+        days, values = self._columns(rows)
+        try:
+            old = read(self.path)
+        except ValueError:
+            old = None
+        count = len(old) if old is not None else 0
+        if (
+            not count
+            or old.meta != self.meta
+            or count > len(days)
+            or old.days != days[:count]
+            or old.values != values[:count]
+        ):
+            return self.write(rows)
+        if count < len(days):
+            self.extend(rows[count:])
+            return True
+        missing = not all(path.exists() for path in self.ledger_paths())
+        if self.shards is not None and not self.shard_dir.is_dir():
+            missing = True
+        return missing and self._render(days, values)
+
+    def ledger_paths(self):
+        """The daily ledger and every resampled one."""
+        return [self.ledger_path, *self.resampled_paths.values()]
+
+    def _render(self, days, values, granularities=None):
+        """Rewrite the daily ledger and the resampled ones in ``granularities``
+        (default: all), with their gzip copies; True if one changed."""
+        rows = dated(days, values)
+        changed = False
+        if granularities is None:
+            granularities = list(self.resampled_paths)
+            changed = atomic.write_lines(
+                self.ledger_path, (self.line(*r) for r in rows)
+            )
+            self._compress(self.ledger_path, changed)
+            if self.shards is not None:
+                self.shards.render(self.shard_dir, rows, self.line)
+        resampled = resample.resample(rows, granularities, self.meta["latest_line"])
+        for g, g_rows in resampled.items():
+            path = self.resampled_paths[g]
+            g_changed = atomic.write_lines(path, (self.line(*r) for r in g_rows))
+            self._compress(path, g_changed)
+            changed |= g_changed
+        return changed
+
+    @staticmethod
+    def _compress(path, changed=True):
+        """Refresh the gzip copy of ``path`` if it changed or has none yet."""
+        if changed or not path.with_name(path.name + ".gz").exists():
+            publish.gzip_copy(path)
+
+    def extend(self, rows):
+        """Append ``rows``, all newer than the stored ones, to the store and to
+        every ledger in place; a missing ledger is rendered from the store.
+
+        Only the new rows are written: the store columns, the daily ledger and
+        its gzip copy (a new gzip member) are appended to, and the resampled
+        ledgers only have their tails updated."""
+        columns = self.load()
+        new_days, new_values = self._columns(rows)
+        if columns is not None and columns.meta == self.meta:
+            append(self.path, new_days, new_values)
+        else:
+            days, values = array("i"), array("d")
+            if columns is not None:
+                days.frombytes(columns.days.tobytes())
+                values.frombytes(columns.values.tobytes())
+            days.extend(new_days)
+            values.extend(new_values)
+            write(self.path, self.meta, days, values)
+        columns = None  # the stored columns are only read back when rendering
+
+        new_lines = [self.line(*r) for r in dated(new_days, new_values)]
+        if self.delta is not None:
+            self.delta.add(new_lines)
+        if not self.ledger_path.exists():
+            stored = read(self.path)
+            self._render(stored.days, stored.values)
+            return
+        text = ledger.append_lines(self.ledger_path, new_lines)
+        publish.gzip_append(self.ledger_path, text)
+        new_rows = dated(new_days, new_values)
+        if self.shards is not None:
+            if self.shard_dir.is_dir():
+                self.shards.append(self.shard_dir, new_rows, self.line)
+            else:
+                self.shards.render(self.shard_dir, read(self.path).rows(), self.line)
+        missing = []
+        for g, path in self.resampled_paths.items():
+            if not path.exists():
+                missing.append(g)
+                continue
+            ledger.update_resampled(
+                path, new_rows, self.line, resample.period_key(g),
+                resample.anchor(g), self.meta["latest_line"],
+            )
+            self._compress(path)
+        if missing:
+            stored = read(self.path)
+            self._render(stored.days, stored.values, missing)
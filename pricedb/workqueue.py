@@ -0,0 +1,121 @@
+"""Stalest-first work queue with a request/time budget and a resumable checkpoint.
+
+An update is split into units (one ticker's prices, one grouped day, one
+corporate-action listing, ...). The queue runs them in ``phase`` order and,
+within a phase, stalest first, so when a run is cut short by its budget (or
+killed) it is the freshest series that wait, not whichever came last in the
+config. A phase only starts once every unit of the earlier phases is done: units
+derived from earlier ones (the dividend-adjusted series) never run on inputs a
+budget stop left stale.
+
+Every finished unit is written to a checkpoint file together with a run id
+(the working directory and market date). A later invocation with the same run
+id skips those units and carries on with the rest; once every unit is done the
+checkpoint is removed, so the next update starts from scratch.
+"""
+import json
+import time
+from datetime import date
+
+from pricedb import atomic
+from pricedb.cache import cache_root
+
+
+def default_checkpoint_path(name):
+    """Where the checkpoint of the ``name`` updater is kept."""
+    return cache_root() / f"{name}-queue.json"
+
+
+class Unit:
+    """One piece of work: ``fn()`` costing about ``cost`` API requests."""
+
+    def __init__(self, key, fn, staleness, phase, cost):
+        self.key = key
+        self.fn = fn
+        self.staleness = staleness
+        self.phase = phase
+        self.cost = cost
+
+
+class WorkQueue:
+    """Runs units within ``max_requests`` / ``time_budget`` seconds (None = no cap).
+
+    ``requests()`` reports the API calls made so far; ``on_checkpoint()`` runs
+    after each unit, before it is marked done (e.g. to save the manifest)."""
+
+    def __init__(self, path, run_id, max_requests=None, time_budget=None,
+                 requests=lambda: 0, on_checkpoint=None):
+        self.path = path
+        self.run_id = run_id
+        self.max_requests = max_requests
+        self.time_budget = time_budget
+        self.requests = requests
+        self.on_checkpoint = on_checkpoint
+        self.units = []
+        self.done = set()
+        try:
+            state = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            state = {}
+        if state.get("run") == self.run_id:
+            self.done = set(state.get("done", []))
+
+    def add(self, key, fn, staleness=None, phase=0, cost=1):
+        """Queue ``fn`` under the unique ``key``; ``staleness`` is the date its data
+        is current to (None = no data yet, runs first)."""
+        self.units.append(Unit(key, fn, staleness or date.min, phase, cost))
+
+    def _over_budget(self, unit, started):
+        """True if running ``unit`` would break the time or request budget."""
+        elapsed = time.monotonic() - started
+        if self.time_budget is not None and elapsed >= self.time_budget:
+            return True
+        return (
+            self.max_requests is not None
+            and unit.cost > 0
+            and self.requests() + unit.cost > self.max_requests
+        )
+
+    def _checkpoint(self):
+        """Persist the finished units."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        state = {"run": self.run_id, "done": sorted(self.done)}
+        atomic.write_text(self.path, json.dumps(state))
+
+    def run(self):
+        """Run the queued units; return the keys left over for the next invocation."""
+        started = time.monotonic()
+        pending = sorted(
+            (u for u in self.units if u.key not in self.done),
+            key=lambda u: (u.phase, u.staleness),
+        )
+        skipped = len(self.units) - len(pending)
+        if skipped:
+            print(f"Resuming: {skipped} unit(s) already done in this run")
+
+        left = []
+        # Phase of the first unit left over; later phases wait for the next run.
+        blocked = None
+        for unit in pending:
+            if blocked is not None and unit.phase > blocked:
+                left.append(unit.key)
+                continue
+            if self._over_budget(unit, started):
+                left.append(unit.key)
+                if blocked is None:
+                    blocked = unit.phase
+                continue
+            unit.fn()
+            if self.on_checkpoint is not None:
+                self.on_checkpoint()
+            self.done.add(unit.key)
+            self._checkpoint()
+
+        if left:
+            print(f"Budget exhausted; {len(left)} unit(s) left for the next run")
+        else:
+            try:
+                self.path.unlink()
+            except FileNotFoundError:
+                pass
+        return left
@@ -1,9 +1,16 @@
 #!/usr/bin/env python3
-import requests
 import argparse
-from datetime import datetime
+import sys
+from datetime import date
 from pathlib import Path
 
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from pricedb import fetch, formats, market_calendar, publish, resample, store
+from pricedb.cache import FOREVER
+from pricedb.manifest import Manifest
+
 # === Stock mapping ===
 CURRENT_STOCKS = {
     "CZ0009008942": "BAACZGCE",  # COLTCZ
@@ -25,59 +32,107 @@ HISTORIC_STOCKS = {
 }
 
 API_URL = "https://www.pse.cz/api/instrument-chart"
-
-
-def fetch_stock_data(isin):
-    """Fetch JSON data for a given ISIN from the PSE API."""
-    resp = requests.get(
+# Chart ranges the API offers below "_MAX", shortest first, with the days of
+# history each is guaranteed to cover.
+CHART_RANGES = [
+    ("_1M", 28),
+    ("_3M", 89),
+    ("_6M", 181),
+    ("_1Y", 365),
+    ("_3Y", 1095),
+    ("_5Y", 1826),
+]
+
+# Module-level fetcher, initialised in main() from the command line.
+_fetcher = None
+# Manifest of the generated ledgers in the working directory, loaded in main().
+_manifest = None
+# Lines added or changed by this run, for the delta feeds; created in main().
+_delta = None
+# Extra PriceSeries outputs (resampled ledgers, year shards) from the command
+# line, set in main().
+_outputs = {}
+
+
+def fetch_stock_data(isin, chart_range="_MAX"):
+    """Fetch JSON data for a given ISIN from the PSE API.
+
+    Historic stocks are no longer traded, so their history is cached for good."""
+    resp = _fetcher.get(
         API_URL,
         headers={"X-API-Key": "PSE"},
-        params={"isin": isin, "range": "_MAX"},
+        params={"isin": isin, "range": chart_range},
+        ttl=FOREVER if isin in HISTORIC_STOCKS and chart_range == "_MAX" else 0,
     )
     resp.raise_for_status()
     return resp.json()
 
 
-def format_line(ts_ms, stock_name, value, currency):
-    """Format one ledger line."""
-    dt = datetime.utcfromtimestamp(ts_ms / 1000)
-    return f"P {dt.strftime('%Y/%m/%d')} {stock_name} {value:.2f} {currency}"
+def chart_range(last_date, today, buffer_days):
+    """The shortest chart range reaching ``buffer_days`` before ``last_date``."""
+    needed = (today - last_date).days + buffer_days
+    for name, days in CHART_RANGES:
+        if days >= needed:
+            return name
+    return "_MAX"
+
+
+def fetch_since(isin, last_date, today, buffer_days):
+    """Fetch the points of ``isin`` from shortly before ``last_date``.
+
+    Returns ``(data, complete)``; ``complete`` is True when the whole history
+    was fetched instead. That happens when the gap is longer than every short
+    range, or when the short answer does not reach back to ``last_date`` (an
+    unknown range name, a gap in the API's data), so nothing can be missed."""
+    name = chart_range(last_date, today, buffer_days)
+    if name != "_MAX":
+        try:
+            data = fetch_stock_data(isin, name)
+            values = data["data"]["value"]
+        except (requests.HTTPError, ValueError, KeyError) as e:
+            print(f"  range {name} failed ({e!r}); fetching the whole history")
+        else:
+            if values and formats.utc_date(values[0][0]) <= last_date:
+                return data, False
+            print(f"  range {name} does not reach {last_date}; fetching everything")
+    return fetch_stock_data(isin), True
+
+
+def stock_series(stock_name, data):
+    """The stored series of one stock, priced in the currency of ``data``."""
+    currency = data["data"]["additional"]["currency"]
+    return store.PriceSeries(
+        stock_name, stock_name, currency, delta=_delta, **_outputs
+    )
+
+
+def process_stock(stock_name, data):
+    """Store the downloaded stock data and render its full and monthly ledgers."""
+    series = stock_series(stock_name, data)
+    changed = series.write(formats.pse_points(data["data"]["value"]))
+    for path in series.ledger_paths():
+        _manifest.record(path)
+    if not changed:
+        print("  unchanged")
 
 
-def process_stock(isin, stock_name):
-    """Download stock data and write full and monthly ledgers."""
-    data = fetch_stock_data(isin)
-    currency = data["data"]["additional"]["currency"]
-    values = data["data"]["value"]
-
-    full_path = Path(f"{stock_name}.ledger")
-    monthly_path = Path(f"{stock_name}-monthly.ledger")
-
-    with open(full_path, "w", encoding="utf-8") as full_file, open(
-        monthly_path, "w", encoding="utf-8"
-    ) as monthly_file:
-        last_month = None
-        last_line = None
-        month_dt = None
-        dt = None
-        for ts_ms, price in values:
-            line = format_line(ts_ms, stock_name, price, currency)
-            full_file.write(line + "\n")
-
-            last_line = line
-
-            dt = datetime.utcfromtimestamp(ts_ms / 1000)
-            month_key = (dt.year, dt.month)
-            if last_month != month_key:
-                monthly_file.write(line + "\n")
-                last_month = month_key
-                month_dt = dt
-
-        if dt is not None and dt != month_dt:
-            ## We want to print the last available line in the monthly file even
-            ## if it is not at the month's threshold.  This keeps the price up to
-            ## date even when only using monthly history.
-            monthly_file.write(last_line + "\n")
+def append_stock(stock_name, data, last_date):
+    """Append the points after ``last_date`` to the store and both ledgers."""
+    series = stock_series(stock_name, data)
+    rows = [
+        (day, price)
+        for day, price in formats.pse_points(data["data"]["value"])
+        if day > last_date
+    ]
+    if not rows:
+        _manifest.record(series.ledger_path)
+        print(f"  up to date (last {last_date}); nothing to append")
+        return
+
+    series.extend(rows)
+    for path in series.ledger_paths():
+        _manifest.record(path)
+    print(f"  appended {len(rows)} day(s): {rows[0][0]} .. {rows[-1][0]}")
 
 
 def main():
@@ -85,15 +140,78 @@ def main():
     parser.add_argument(
         "--historic", action="store_true", help="Include historic stocks."
     )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--since-last",
+        dest="full_rebuild",
+        action="store_false",
+        default=False,
+        help="Fetch the shortest chart range covering the days after the last "
+        "date in each ledger and append the new points (default)",
+    )
+    mode.add_argument(
+        "--full-rebuild",
+        dest="full_rebuild",
+        action="store_true",
+        help="Download the whole history (range _MAX) and rewrite every ledger",
+    )
+    parser.add_argument(
+        "--buffer-days",
+        type=int,
+        default=7,
+        help="Days of backward overlap when fetching the incremental update.",
+    )
+    resample.add_arguments(parser)
+    publish.add_arguments(parser)
+    fetch.add_arguments(parser)
     args = parser.parse_args()
+    try:
+        granularities = resample.from_args(args)
+    except ValueError as e:
+        sys.exit(f"Error: {e}")
 
     stocks = CURRENT_STOCKS.copy()
     if args.historic:
         stocks.update(HISTORIC_STOCKS)
 
+    global _fetcher, _manifest, _delta, _outputs
+    _fetcher = fetch.from_args(args)
+    _manifest = Manifest()
+    _delta = publish.DeltaLog()
+    _outputs = {
+        "granularities": granularities,
+        "shards": publish.shards_from_args(args),
+    }
+
+    today = date.today()
+    last_dates = {}
     for isin, name in stocks.items():
+        last_date = None
+        if not args.full_rebuild and Path(f"{name}-monthly.ledger").exists():
+            last_date = _manifest.last_date(f"{name}.ledger")
+        if market_calendar.new_data_possible(market_calendar.PSE, last_date, today):
+            last_dates[isin] = last_date
+        else:
+            print(f"{name} is up to date (last {last_date})")
+
+    def download(isin):
+        last_date = last_dates[isin]
+        if last_date is None:
+            return fetch_stock_data(isin), True
+        return fetch_since(isin, last_date, today, args.buffer_days)
+
+    for isin, future in _fetcher.map(download, last_dates):
+        name = stocks[isin]
         print(f"Processing {name} ({isin})...")
-        process_stock(isin, name)
+        data, complete = future.result()
+        if complete:
+            process_stock(name, data)
+        else:
+            append_stock(name, data, last_dates[isin])
+    _manifest.save()
+    _delta.save()
+    if args.consolidate:
+        publish.consolidate()
 
 
 if __name__ == "__main__":
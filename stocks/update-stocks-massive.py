@@ -9,39 +9,64 @@ Prices are fetched **raw** (``adjusted=False``): no split or dividend adjustment
 Splits are handled manually in ledger by editing lots, so the committed price series
 must stay raw. This also caches dividends (``<ticker>-dividend.csv``) for the
 ``also_dividend_adjusted`` tickers; the dividend-adjusted ("d") price series itself
-is computed by a separate step.
+is computed by a separate step, along with any ``dividend_adjusted_variants`` (other
+tax rates, with or without splits) listed in the config.
 
 Because the free plan only serves ~2 years of history, this script is
 **incremental**: it reads the last date already in the committed ``<base>.ledger``,
 fetches from ``last_date - buffer`` to today, and appends only the missing days.
 With ``to = today`` this covers any gap since the last run regardless of size.
+
+With ``--grouped`` the missing days are fetched with one grouped-daily request per
+day (every US stock's bar for that date) and fanned out to all tickers, so a daily
+run costs one request however many tickers are configured. Tickers that need a
+long backfill keep using per-ticker requests.
 """
 import argparse
 import bisect
 import csv
+import gzip
+import hashlib
+import json
 import os
 import re
 import sys
-import time
 from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache, partial
+from itertools import islice
 from pathlib import Path
 from zoneinfo import ZoneInfo
 
 import yaml
 from massive import RESTClient
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from pricedb import atomic, formats, ledger, market_calendar, publish, resample, store
+from pricedb.manifest import Manifest
+from pricedb.ratelimit import RateLimiter, default_state_path, parse_rate_limit
+from pricedb.workqueue import WorkQueue, default_checkpoint_path
+
 # massive/Polygon daily-bar timestamps mark the start of the trading day in US
 # Eastern time; convert with this zone to get the correct calendar date.
 MARKET_TZ = ZoneInfo("America/New_York")
 # Free plan: 5 requests / minute (rolling). Pace calls proactively; the SDK also
-# retries 429s, but its default backoff is too small for a per-minute cap.
-MIN_REQUEST_INTERVAL = 13.0
+# retries 429s, but its default backoff is too small for a per-minute cap. Paid
+# plans are unlimited: pass --rate-limit 0.
+DEFAULT_RATE_LIMIT = "5/60"
+# How often a call is retried after the API still answered 429.
+RATE_LIMIT_RETRIES = 3
 # How far back to fetch when a ledger file is missing/empty (free-plan history cap).
 BACKFILL_DAYS = 730
+# Day-aggregate flat files merged into the ledgers per batch by --import-flatfiles;
+# bounds memory to this many days of closes for the configured tickers.
+FLATFILE_BATCH_DAYS = 250
 # Refetch a ticker's dividend cache only once we're ~a quarter past its last payout.
 DIVIDEND_CACHE_MONTHS = 3
 # Default withholding-tax drag on dividends reinvested in the "d" total-return series.
 DIVIDEND_TAX_RATE = 0.15
+# Items per page of the paginated listings (dividends, splits); each page is one
+# API request.
+PAGE_SIZE = 1000
 # Columns for <ticker>-dividend.csv (pay_date first: the reinvestment date).
 DIVIDEND_COLUMNS = [
     "pay_date", "ex_dividend_date", "record_date", "declaration_date",
@@ -56,25 +81,74 @@ SPLIT_COLUMNS = [
 
 # Module-level client, initialised in main() once the API key is known.
 _client = None
+# Manifest of the generated files in the working directory, loaded in main().
+_manifest = None
+# Lines added or changed by this run, for the delta feeds; created in main().
+_delta = None
+# Extra PriceSeries outputs (resampled ledgers, year shards) from the command
+# line, set in main().
+_outputs = {}
 
 
 class MassiveClient:
-    """Wraps the massive SDK RESTClient and paces calls under the rate limit."""
+    """Wraps the massive SDK RESTClient and paces calls under the rate limit.
 
-    def __init__(self, api_key):
-        self.client = RESTClient(api_key, retries=5)
-        self._last_call = 0.0
+    Calls are gated by a ``RateLimiter`` shared on disk, so back-to-back and
+    concurrent runs draw from the same rolling window. If the API still answers
+    429 (the SDK gives up after its own short retries), the whole window is
+    blocked for every process and the call is retried."""
 
-    def _throttle(self):
-        wait = MIN_REQUEST_INTERVAL - (time.monotonic() - self._last_call)
-        if wait > 0:
-            time.sleep(wait)
+    def __init__(self, api_key, rate_limit=DEFAULT_RATE_LIMIT):
+        self.client = RESTClient(api_key, retries=5)
+        limit = parse_rate_limit(rate_limit)
+        self.limiter = (
+            RateLimiter(default_state_path("massive"), *limit) if limit else None
+        )
+        # API calls made so far, for the --max-requests budget.
+        self.calls = 0
+
+    def _acquire(self):
+        """Take a rate-limiter slot for one API request and count it."""
+        if self.limiter is not None:
+            self.limiter.acquire()
+        self.calls += 1
+
+    def _call(self, fn):
+        """Run one API call ``fn()`` under the rate limiter, retrying on 429."""
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            self._acquire()
+            try:
+                return fn()
+            except Exception as e:
+                retry = attempt < RATE_LIMIT_RETRIES and is_rate_limited(e)
+                if self.limiter is None or not retry:
+                    raise
+                print("  rate limited by the API; waiting for the window to reset")
+                self.limiter.penalize()
+
+    def _list(self, listing):
+        """All items of a paginated SDK listing, e.g. ``list_stocks_dividends``.
+
+        The SDK fetches a page of PAGE_SIZE items whenever the previous one is
+        used up, so every page after the first takes its own limiter slot and
+        counts as a request (a last page of exactly PAGE_SIZE items costs one
+        slot too many). A 429 restarts the listing from its first page."""
+        def pages():
+            items = []
+            it = iter(listing(limit=PAGE_SIZE))
+            while True:
+                if items:
+                    self._acquire()
+                page = list(islice(it, PAGE_SIZE))
+                items.extend(page)
+                if len(page) < PAGE_SIZE:
+                    return items
+        return self._call(pages)
 
     def daily_bars(self, symbol, from_date, to_date):
         """Return raw daily OHLC bars (list of Agg) for ``symbol``."""
-        self._throttle()
-        try:
-            aggs = self.client.get_aggs(
+        aggs = self._call(
+            lambda: self.client.get_aggs(
                 ticker=symbol,
                 multiplier=1,
                 timespan="day",
@@ -84,27 +158,48 @@ class MassiveClient:
                 sort="asc",
                 limit=50000,
             )
-        finally:
-            self._last_call = time.monotonic()
+        )
+        return aggs or []
+
+    def grouped_daily(self, day):
+        """Return raw daily bars (list of GroupedDailyAgg) of every US stock on ``day``."""
+        aggs = self._call(
+            lambda: self.client.get_grouped_daily_aggs(
+                day.isoformat(), adjusted=False, include_otc=False
+            )
+        )
         return aggs or []
 
     def dividends(self, symbol):
         """Return all dividends (list of StockDividend) for ``symbol``."""
-        self._throttle()
-        try:
-            divs = list(self.client.list_stocks_dividends(ticker=symbol, limit=1000))
-        finally:
-            self._last_call = time.monotonic()
-        return divs
+        return self._list(partial(self.client.list_stocks_dividends, ticker=symbol))
+
+    def dividends_since(self, symbols, since):
+        """Return dividends of all ``symbols`` that went ex on/after ``since``.
+
+        One paginated listing instead of one call per ticker; ``since=None``
+        fetches the whole history."""
+        kwargs = {"ticker_any_of": ",".join(symbols)}
+        if since is not None:
+            kwargs["ex_dividend_date_gte"] = since.isoformat()
+        return self._list(partial(self.client.list_stocks_dividends, **kwargs))
+
+    def splits_since(self, symbols, since):
+        """Return splits of all ``symbols`` executed on/after ``since``."""
+        kwargs = {"ticker_any_of": ",".join(symbols)}
+        if since is not None:
+            kwargs["execution_date_gte"] = since.isoformat()
+        return self._list(partial(self.client.list_stocks_splits, **kwargs))
 
     def splits(self, symbol):
         """Return all splits (list of StockSplit) for ``symbol``."""
-        self._throttle()
-        try:
-            sp = list(self.client.list_stocks_splits(ticker=symbol, limit=1000))
-        finally:
-            self._last_call = time.monotonic()
-        return sp
+        return self._list(partial(self.client.list_stocks_splits, ticker=symbol))
+
+
+def is_rate_limited(error):
+    """True if an SDK exception is the API's 429 / too-many-requests answer."""
+    message = str(error).lower()
+    return "429" in message or "too many" in message or "maximum requests" in message
 
 
 def load_config(config_path="config.yaml"):
@@ -115,6 +210,7 @@ def load_config(config_path="config.yaml"):
         config.get("current_stocks", []),
         config.get("historic_stocks", []),
         config.get("also_dividend_adjusted", []),
+        [Variant.from_config(v) for v in config.get("dividend_adjusted_variants", [])],
     )
 
 
@@ -125,28 +221,24 @@ def output_base(ticker):
     return re.sub(r"[^A-Za-z0-9]", "_", ticker)
 
 
-def format_line(date, ticker, close_value, currency="USD"):
-    """Format one ledger price line, e.g. 'P 2026/06/03 AAPL 310.26 USD'."""
-    return f"P {date.strftime('%Y/%m/%d')} {ticker} {close_value:.2f} {currency}"
+def save_state():
+    """Save the manifest and the delta feeds (after every finished unit)."""
+    _manifest.save()
+    _delta.save()
+
+
+def price_series(base):
+    """The stored series behind <base>.ledger, rendered as price lines such as
+    'P 2026/06/03 AAPL 310.26 USD'."""
+    return store.PriceSeries(base, base, "USD", delta=_delta, **_outputs)
 
 
 def parse_ledger(text):
     """Parse a .ledger price file into a sorted list of (date, close) tuples."""
-    rows = []
-    for line in text.splitlines():
-        parts = line.split()
-        if len(parts) < 5 or parts[0] != "P":
-            continue
-        try:
-            date = datetime.strptime(parts[1], "%Y/%m/%d").date()
-            close = float(parts[3])
-        except ValueError:
-            continue
-        rows.append((date, close))
-    rows.sort(key=lambda r: r[0])
-    return rows
+    return sorted(formats.ledger_prices(text.splitlines()), key=lambda r: r[0])
 
 
+@lru_cache(maxsize=1 << 12)
 def et_date(ts_ms):
     """Calendar (ET) date for a daily bar's millisecond timestamp."""
     return (
@@ -156,27 +248,6 @@ def et_date(ts_ms):
     )
 
 
-def write_monthly(path, rows, ticker):
-    """Write the monthly ledger: first trading day of each month, plus the very
-    last available line so the latest price is present even mid-month."""
-    lines = []
-    last_month = None
-    month_date = None
-    last_line = None
-    date = None
-    for date, close in rows:
-        line = format_line(date, ticker, close)
-        month_key = (date.year, date.month)
-        if last_month != month_key:
-            lines.append(line)
-            last_month = month_key
-            month_date = date
-        last_line = line
-    if rows and date != month_date:
-        lines.append(last_line)
-    path.write_text("".join(l + "\n" for l in lines), encoding="utf-8")
-
-
 def add_months(d, months):
     """Add calendar months to a date, clamping the day to the month's length."""
     month_index = d.month - 1 + months
@@ -189,18 +260,23 @@ def add_months(d, months):
 
 def last_dividend_pay_date(path):
     """Latest pay_date in a dividend CSV, or None if it lists no dividends."""
+    return last_csv_date(path, "pay_date")
+
+
+def last_csv_date(path, column):
+    """Latest YYYY-MM-DD date in ``column`` of a CSV, or None if there is none."""
     latest = None
     with open(path, newline="", encoding="utf-8") as f:
         for row in csv.DictReader(f):
-            value = row.get("pay_date")
+            value = row.get(column)
             if not value:
                 continue
             try:
-                pay = datetime.strptime(value, "%Y-%m-%d").date()
+                day = formats.ymd(value)
             except ValueError:
                 continue
-            if latest is None or pay > latest:
-                latest = pay
+            if latest is None or day > latest:
+                latest = day
     return latest
 
 
@@ -208,7 +284,15 @@ def dividend_cache_fresh(path):
     """True if the cached dividend CSV is recent enough to skip re-fetching."""
     if not path.exists():
         return False
-    last_pay = last_dividend_pay_date(path)
+    entry = _manifest.get(path)
+    if entry is not None and "last_pay_date" in entry:
+        last_pay = entry["last_pay_date"] and date.fromisoformat(entry["last_pay_date"])
+    else:
+        last_pay = last_dividend_pay_date(path)
+        # Index it so the next run can decide from the manifest alone.
+        _manifest.record(
+            path, fetched=False, last_pay_date=last_pay.isoformat() if last_pay else None
+        )
     if last_pay is None:
         # File exists but lists no dividends (a non-payer) -> don't re-hit the API.
         return True
@@ -219,8 +303,8 @@ def dividend_cache_fresh(path):
 def write_dividend_csv(path, dividends):
     """Write dividends to CSV: pay_date first column, sorted ascending by pay_date."""
     dividends = sorted(dividends, key=lambda d: d.pay_date or "")
-    with open(path, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
+    with atomic.AtomicFile(path, newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
         writer.writerow(DIVIDEND_COLUMNS)
         for div in dividends:
             writer.writerow(
@@ -234,8 +318,8 @@ def write_dividend_csv(path, dividends):
 def write_split_csv(path, splits):
     """Write splits to CSV: execution_date first column, sorted ascending."""
     splits = sorted(splits, key=lambda s: s.execution_date or "")
-    with open(path, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
+    with atomic.AtomicFile(path, newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
         writer.writerow(SPLIT_COLUMNS)
         for split in splits:
             writer.writerow(
@@ -246,6 +330,89 @@ def write_split_csv(path, splits):
             )
 
 
+def record_dividend_csv(path):
+    """Index a dividend CSV in the manifest together with its last pay date."""
+    last_pay = last_dividend_pay_date(path)
+    _manifest.record(path, last_pay_date=last_pay.isoformat() if last_pay else None)
+
+
+def merge_csv(path, columns, items):
+    """Merge SDK objects into a corporate-action CSV, keyed by their ``id``.
+
+    Rows already in the file are kept unless a fetched item with the same id
+    replaces them; the result is sorted ascending by the first column."""
+    rows = {}
+    if path.exists():
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            next(reader, None)  # header
+            for row in reader:
+                rows[row[-1]] = row
+    for item in items:
+        row = [
+            "" if getattr(item, col, None) is None else str(getattr(item, col))
+            for col in columns
+        ]
+        rows[row[-1]] = row
+    with atomic.AtomicFile(path, newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(columns)
+        writer.writerows(sorted(rows.values(), key=lambda r: r[0]))
+    return len(rows)
+
+
+def process_corporate_actions(tickers):
+    """Refresh the dividend (and existing split) CSVs of all ``tickers`` at once.
+
+    The DIVIDEND_CACHE_MONTHS freshness gate no longer decides per ticker whether
+    to call the API; it decides the window. If any cache is stale, one batched
+    listing fetches every ticker's dividends that went ex since the oldest stale
+    cache's last ex-date (the whole history if a cache is missing), and the
+    result is merged into each <base>-dividend.csv. Splits are refreshed the same
+    way for tickers that already have a <base>-split.csv."""
+    stale = [
+        t
+        for t in tickers
+        if not dividend_cache_fresh(Path(f"{output_base(t)}-dividend.csv"))
+    ]
+    if not stale:
+        print("Dividends fresh for all tickers; skipping fetch")
+        return
+
+    since = None
+    for ticker in stale:
+        path = Path(f"{output_base(ticker)}-dividend.csv")
+        last_ex = last_csv_date(path, "ex_dividend_date") if path.exists() else None
+        if last_ex is None:
+            since = None
+            break
+        since = last_ex if since is None else min(since, last_ex)
+
+    print(f"Dividends for {', '.join(tickers)} since {since or 'the beginning'}...")
+    by_ticker = {}
+    for div in _client.dividends_since(tickers, since):
+        by_ticker.setdefault(div.ticker, []).append(div)
+    for ticker in tickers:
+        path = Path(f"{output_base(ticker)}-dividend.csv")
+        fetched = by_ticker.get(ticker, [])
+        total = merge_csv(path, DIVIDEND_COLUMNS, fetched)
+        record_dividend_csv(path)
+        print(f"  {ticker}: {len(fetched)} fetched, {total} cached -> {path.name}")
+
+    split_tickers = [t for t in tickers if Path(f"{output_base(t)}-split.csv").exists()]
+    if split_tickers:
+        print(f"Splits for {', '.join(split_tickers)}...")
+        by_ticker = {}
+        for split in _client.splits_since(split_tickers, since):
+            by_ticker.setdefault(split.ticker, []).append(split)
+        for ticker in split_tickers:
+            path = Path(f"{output_base(ticker)}-split.csv")
+            fetched = by_ticker.get(ticker, [])
+            total = merge_csv(path, SPLIT_COLUMNS, fetched)
+            _manifest.record(path)
+            print(f"  {ticker}: {len(fetched)} fetched, {total} cached -> {path.name}")
+
+
 def process_dividends(ticker):
     """Refresh <base>-dividend.csv for one ticker, honoring the freshness gate."""
     base = output_base(ticker)
@@ -255,6 +422,7 @@ def process_dividends(ticker):
         return
     dividends = _client.dividends(ticker)
     write_dividend_csv(path, dividends)
+    record_dividend_csv(path)
     print(f"  cached {len(dividends)} dividend(s) -> {path.name}")
 
 
@@ -264,6 +432,7 @@ def process_splits(ticker):
     path = Path(f"{base}-split.csv")
     splits = _client.splits(ticker)
     write_split_csv(path, splits)
+    _manifest.record(path)
     print(f"  cached {len(splits)} split(s) -> {path.name}")
 
 
@@ -272,7 +441,7 @@ def parse_iso_date(value):
     if not value:
         return None
     try:
-        return datetime.strptime(value, "%Y-%m-%d").date()
+        return formats.ymd(value)
     except ValueError:
         return None
 
@@ -319,14 +488,32 @@ def parse_split_csv(path):
     return out
 
 
-def process_dividend_adjusted(ticker, tax_rate):
-    """Rebuild the DRIP total-return <base>d.ledger from raw prices + dividends.
+class Variant:
+    """One dividend-adjusted series: <base><suffix>.ledger.
+
+    ``tax_rate`` is the withholding drag on reinvested dividends; with ``splits``
+    off, <base>-split.csv is ignored (a pure dividend series)."""
+
+    def __init__(self, suffix, tax_rate, splits=True):
+        self.suffix = suffix
+        self.tax_rate = tax_rate
+        self.splits = splits
+
+    @classmethod
+    def from_config(cls, entry):
+        return cls(
+            entry["suffix"], float(entry["tax_rate"]), bool(entry.get("splits", True))
+        )
+
+
+def total_return_series(raw_rows, dividends, splits, variants):
+    """Back-adjusted DRIP total-return closes for several variants at once.
 
     Back-adjustment (a "would DRIP-ing this have beaten my portfolio?" benchmark):
     the most recent price equals the raw price, and every *earlier* price is made
     cheaper so that buying at the adjusted price captures the stock's return plus
-    dividends reinvested net of ``tax_rate``. A dividend with ex-dividend date e
-    (the day the price drops and you become entitled) contributes a factor
+    dividends reinvested net of the variant's tax rate. A dividend with ex-dividend
+    date e (the day the price drops and you become entitled) contributes a factor
 
         factor = 1 + net_div / close_e          (net_div = cash * (1 - tax_rate))
 
@@ -334,79 +521,291 @@ def process_dividend_adjusted(ticker, tax_rate):
 
         adjusted[t] = raw[t] / product(factor_i for all ex dates e_i > t)
 
-    So adjusted == raw from today back to the last ex-date, then diverges. The whole
-    file is rewritten every run (a pure function of raw + dividends): when a dividend
-    goes ex, all prices before it correctly become cheaper.
-
-    If a ``<base>-split.csv`` exists (downloaded via ``--download-splits``), splits
-    are folded in too: prices before a split's execution date are divided by
-    ``split_to/split_from``, keeping the total-return series continuous across it."""
-    base = output_base(ticker)
-    d_base = base + "d"
-    raw_rows = parse_ledger(Path(f"{base}.ledger").read_text(encoding="utf-8")) \
-        if Path(f"{base}.ledger").exists() else []
-    if not raw_rows:
-        print(f"  {d_base}: no raw prices; skipping")
-        return
+    So adjusted == raw from today back to the last ex-date, then diverges. Splits
+    (for variants that fold them) divide every price strictly before the split's
+    execution date by ``split_to/split_from``, keeping the series continuous.
 
+    The raw closes are loaded and each event is located in them once. A variant
+    then divides each run of closes between two events by that run's divisor in
+    one comprehension over the slice, instead of testing events row by row.
+    Returns {suffix: ([adjusted closes], final divisor)} aligned with
+    ``raw_rows``."""
     raw_dates = [d for d, _ in raw_rows]
-    close_by_date = dict(raw_rows)
+    closes = [c for _, c in raw_rows]
     first_raw, last_raw = raw_dates[0], raw_dates[-1]
 
     # Each dividend is captured on its ex-dividend date -- that's when the price
     # drops and you become entitled to the payout (buying before ex earns it). The
-    # net dividend buys shares at the ex-date close: factor = 1 + net_div/close_ex,
-    # applied to every price strictly *before* the ex date. Ignore dividends that
-    # went ex before our price history starts or have not gone ex yet.
-    events = []  # (effective_ex_date, factor)
-    for _pay, ex_date, cash in parse_dividend_csv(Path(f"{base}-dividend.csv")):
-        if ex_date is None or ex_date < first_raw or ex_date > last_raw:
+    # net dividend buys shares at the ex-date close. Ignore dividends that went ex
+    # before our price history starts or have not gone ex yet.
+    dividend_events = []  # (effective ex date, cash, close_ex)
+    for ex_date, cash in dividends:
+        if ex_date < first_raw or ex_date > last_raw:
             continue
-        eff = raw_dates[bisect.bisect_left(raw_dates, ex_date)]
-        ref_close = close_by_date[eff]
-        if ref_close > 0:
-            events.append((eff, 1.0 + cash * (1 - tax_rate) / ref_close))
-
-    # Fold in splits if a <base>-split.csv has been downloaded (--download-splits):
-    # a split on execution day E multiplies the share count by split_to/split_from,
-    # so every price strictly before E is divided by that ratio (standard split
-    # back-adjustment). No reference price needed -- it's a pure share ratio.
-    for exec_date, split_from, split_to in parse_split_csv(Path(f"{base}-split.csv")):
+        eff = bisect.bisect_left(raw_dates, ex_date)
+        if closes[eff] > 0:
+            dividend_events.append((raw_dates[eff], cash, closes[eff]))
+
+    # A split on execution day E multiplies the share count by split_to/split_from.
+    # No reference price needed -- it's a pure share ratio.
+    split_events = []  # (execution date, ratio)
+    for exec_date, split_from, split_to in splits:
         if first_raw < exec_date <= last_raw:
-            events.append((exec_date, split_to / split_from))
-
-    events.sort()
-
-    # Walk newest -> oldest, folding in each factor once we pass (strictly before)
-    # its pay date, so prices before a dividend are divided by all later factors.
-    d_rows = []
-    divisor = 1.0
-    ei = len(events) - 1
-    for date in reversed(raw_dates):
-        while ei >= 0 and events[ei][0] > date:
-            divisor *= events[ei][1]
-            ei -= 1
-        d_rows.append((date, close_by_date[date] / divisor))
-    d_rows.reverse()
-
-    Path(f"{d_base}.ledger").write_text(
-        "".join(format_line(d, d_base, v) + "\n" for d, v in d_rows), encoding="utf-8"
-    )
-    write_monthly(Path(f"{d_base}-monthly.ledger"), d_rows, d_base)
-    print(f"  {d_base}: wrote {len(d_rows)} rows ({first_raw} .. {last_raw})")
+            split_events.append((exec_date, split_to / split_from))
+
+    series = {}
+    for variant in variants:
+        events = [
+            (eff, 1.0 + cash * (1 - variant.tax_rate) / close)
+            for eff, cash, close in dividend_events
+        ]
+        if variant.splits:
+            events.extend(split_events)
+        events.sort()
+
+        # Walk the events newest -> oldest. The closes from an event's date up
+        # to the next (newer) event are divided by the factors of all later
+        # events; then its own factor is folded in for everything before it.
+        adjusted = [0.0] * len(closes)
+        divisor = 1.0
+        end = len(closes)
+        for event_date, factor in reversed(events):
+            cut = min(bisect.bisect_left(raw_dates, event_date), end)
+            adjusted[cut:end] = [close / divisor for close in closes[cut:end]]
+            end = cut
+            if not end:
+                break  # this and older events precede every close
+            divisor *= factor
+        adjusted[:end] = [close / divisor for close in closes[:end]]
+        series[variant.suffix] = (adjusted, divisor)
+    return series
+
+
+def rebuild_dividend_adjusted(ticker, variants):
+    """Rewrite the given dividend-adjusted variants of one ticker from scratch.
+
+    Each <base><suffix>.ledger is a pure function of raw prices + corporate
+    actions, so when a dividend goes ex all prices before it correctly become
+    cheaper. ``process_dividend_adjusted`` calls this only when that happens (or
+    its saved state is unusable); other days just append."""
+    base = output_base(ticker)
+    raw_path = Path(f"{base}.ledger")
+    raw_rows = price_series(base).rows()
+    if not raw_rows:
+        print(f"  {base}: no raw prices; skipping dividend-adjusted series")
+        return
+
+    raw_dates = [d for d, _ in raw_rows]
+    first_raw, last_raw = raw_dates[0], raw_dates[-1]
+    dividends, splits = adjustment_inputs(base)
+    raw_tail = ledger.tail_lines(raw_path, 1)[0][1]
+    raw_size = raw_path.stat().st_size
+
+    series = total_return_series(raw_rows, dividends, splits, variants)
+    for variant in variants:
+        d_base = base + variant.suffix
+        adjusted, divisor = series[variant.suffix]
+        d_rows = list(zip(raw_dates, adjusted))
+        d_series = price_series(d_base)
+        d_series.write(d_rows)
+
+        applied, pending = split_inputs(
+            dividends, splits if variant.splits else [], first_raw, last_raw
+        )
+        save_adjustment_state(
+            Path(f"{d_base}.state.json"),
+            {
+                "tax_rate": variant.tax_rate,
+                "splits": variant.splits,
+                "dividend_hash": file_hash(Path(f"{base}-dividend.csv")),
+                "split_hash": split_file_hash(base, variant),
+                "raw_size": raw_size,
+                "raw_last_line": raw_tail,
+                "first_date": first_raw.isoformat(),
+                "last_date": last_raw.isoformat(),
+                "divisor": divisor,
+                "applied": applied,
+                "pending": pending,
+            },
+        )
+        for path in d_series.ledger_paths():
+            _manifest.record(path, fetched=False)
+        print(f"  {d_base}: wrote {len(d_rows)} rows ({first_raw} .. {last_raw})")
+
+
+def file_hash(path):
+    """sha256 of a file's content, or None if it does not exist."""
+    if not path.exists():
+        return None
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def split_file_hash(base, variant):
+    """Hash of <base>-split.csv as far as ``variant`` depends on it."""
+    return file_hash(Path(f"{base}-split.csv")) if variant.splits else None
+
+
+def adjustment_inputs(base, splits=True):
+    """The corporate actions the dividend-adjusted series are built from.
+
+    Returns ([(ex_date, cash)], [(execution_date, split_from, split_to)]) read
+    from <base>-dividend.csv and <base>-split.csv (missing files give [])."""
+    dividends = [
+        (ex_date, cash)
+        for _pay, ex_date, cash in parse_dividend_csv(Path(f"{base}-dividend.csv"))
+        if ex_date is not None
+    ]
+    split_rows = parse_split_csv(Path(f"{base}-split.csv")) if splits else []
+    return dividends, split_rows
+
+
+def split_inputs(dividends, splits, first_raw, last_raw):
+    """Partition corporate actions by the raw price range, as JSON-ready lists.
+
+    ``applied`` are the events already folded into the series; ``pending`` are
+    the ones past ``last_raw`` that will force a rebuild once prices reach them.
+    Events before the price history starts never matter and are dropped."""
+    applied, pending = [], []
+    for ex_date, cash in dividends:
+        if ex_date > last_raw:
+            pending.append(["dividend", ex_date.isoformat(), cash])
+        elif ex_date >= first_raw:
+            applied.append(["dividend", ex_date.isoformat(), cash])
+    for exec_date, split_from, split_to in splits:
+        if exec_date > last_raw:
+            pending.append(["split", exec_date.isoformat(), split_from, split_to])
+        elif exec_date > first_raw:
+            applied.append(["split", exec_date.isoformat(), split_from, split_to])
+    return sorted(applied), sorted(pending)
+
+
+def load_adjustment_state(path):
+    """The saved state of a dividend-adjusted series, or None if missing/unreadable."""
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def save_adjustment_state(path, state):
+    atomic.write_text(path, json.dumps(state, indent=1) + "\n")
+
+
+def raw_rows_since(path, size, last_line):
+    """Rows appended to a raw ledger after it was ``size`` bytes long.
+
+    Returns None if the file no longer ends with ``last_line`` at that size
+    (it was rewritten or edited), in which case the caller must rebuild."""
+    if not path.exists() or path.stat().st_size < size:
+        return None
+    start = size - len(last_line.encode("utf-8")) - 1
+    with open(path, "rb") as f:
+        f.seek(max(0, start))
+        data = f.read().decode("utf-8")
+    expected = last_line + "\n"
+    if start < 0 or not data.startswith(expected):
+        return None
+    return parse_ledger(data[len(expected):])
+
+
+def append_dividend_adjusted(base, variant):
+    """Append the new raw closes to one variant if no corporate action landed.
+
+    The series is back-adjusted, so a new ex-date or split inside the price range
+    changes every earlier price and needs a rebuild. On every other day the new
+    raw closes are appended unchanged (nothing after them adjusts them).
+    ``<base><suffix>.state.json`` remembers what the series was built from: the
+    tax rate, the hashes of the dividend and split CSVs, the raw ledger's size
+    and last line, and the applied and pending events.
+
+    Returns False when the variant must be rebuilt instead."""
+    d_base = base + variant.suffix
+    d_series = price_series(d_base)
+    state_path = Path(f"{d_base}.state.json")
+
+    state = load_adjustment_state(state_path)
+    if state is None or not d_series.ledger_path.exists():
+        return False
+    if (state.get("tax_rate"), state.get("splits", True)) != (
+        variant.tax_rate,
+        variant.splits,
+    ):
+        return False
+
+    raw_path = Path(f"{base}.ledger")
+    new_rows = raw_rows_since(raw_path, state["raw_size"], state["raw_last_line"])
+    if new_rows is None:
+        print(f"  {d_base}: raw prices changed; rebuilding")
+        return False
+
+    dividend_hash = file_hash(Path(f"{base}-dividend.csv"))
+    split_hash = split_file_hash(base, variant)
+    if (dividend_hash, split_hash) != (state["dividend_hash"], state["split_hash"]):
+        first_raw = date.fromisoformat(state["first_date"])
+        last_raw = date.fromisoformat(state["last_date"])
+        applied, pending = split_inputs(
+            *adjustment_inputs(base, variant.splits), first_raw, last_raw
+        )
+        if applied != state["applied"]:
+            print(f"  {d_base}: corporate actions changed; rebuilding")
+            return False
+        state.update(dividend_hash=dividend_hash, split_hash=split_hash, pending=pending)
+
+    if new_rows:
+        new_last = new_rows[-1][0].isoformat()
+        if any(event[1] <= new_last for event in state["pending"]):
+            print(f"  {d_base}: new ex-date/split in range; rebuilding")
+            return False
+
+        d_series.extend(new_rows)
+        state.update(
+            raw_size=raw_path.stat().st_size,
+            raw_last_line=ledger.tail_lines(raw_path, 1)[0][1],
+            last_date=new_last,
+        )
+        for path in d_series.ledger_paths():
+            _manifest.record(path, fetched=False)
+        print(f"  {d_base}: appended {len(new_rows)} row(s) (no new corporate action)")
+    else:
+        print(f"  {d_base}: up to date")
+    save_adjustment_state(state_path, state)
+    return True
+
+
+def process_dividend_adjusted(ticker, variants):
+    """Bring every dividend-adjusted variant of one ticker up to date.
+
+    Variants that can simply append do so; the rest are rebuilt together, so the
+    raw prices and corporate actions are loaded once however many there are."""
+    base = output_base(ticker)
+    stale = [v for v in variants if not append_dividend_adjusted(base, v)]
+    if stale:
+        rebuild_dividend_adjusted(ticker, stale)
+
+
+def append_rows(base, new_rows):
+    """Append ``new_rows`` to the stored series, <base>.ledger and the resampled
+    ledgers (<base>-monthly.ledger and any from ``--resample``).
+
+    The resampled files are updated in place (see ``ledger.update_resampled``);
+    one is only rendered from the whole series when it does not exist yet."""
+    series = price_series(base)
+    series.extend(new_rows)
+    for path in series.ledger_paths():
+        _manifest.record(path)
+    print(f"  appended {len(new_rows)} day(s): {new_rows[0][0]} .. {new_rows[-1][0]}")
 
 
 def process_stock(ticker, buffer_days):
     """Incrementally update the raw daily and monthly ledgers for one ticker."""
     base = output_base(ticker)
-    daily_path = Path(f"{base}.ledger")
-    monthly_path = Path(f"{base}-monthly.ledger")
-
-    existing_raw = daily_path.read_text(encoding="utf-8") if daily_path.exists() else ""
-    existing_rows = parse_ledger(existing_raw)
-    last_date = existing_rows[-1][0] if existing_rows else None
+    last_date = _manifest.last_date(Path(f"{base}.ledger"))
 
     today = datetime.now(MARKET_TZ).date()
+    if not market_calendar.new_data_possible(market_calendar.US, last_date, today):
+        _manifest.record(f"{base}.ledger")
+        print(f"  up to date (last {last_date}); no trading day since")
+        return
     if last_date is not None:
         from_date = last_date - timedelta(days=buffer_days)
     else:
@@ -425,19 +824,198 @@ def process_stock(ticker, buffer_days):
     new_rows.sort(key=lambda r: r[0])
 
     if not new_rows:
+        _manifest.record(f"{base}.ledger")
         print(f"  up to date (last {last_date}); nothing to append")
         return
 
-    with open(daily_path, "a", encoding="utf-8") as f:
-        if existing_raw and not existing_raw.endswith("\n"):
-            f.write("\n")
-        for date, close in new_rows:
-            f.write(format_line(date, base, close) + "\n")
+    append_rows(base, new_rows)
 
-    all_rows = existing_rows + new_rows
-    write_monthly(monthly_path, all_rows, base)
 
-    print(f"  appended {len(new_rows)} day(s): {new_rows[0][0]} .. {new_rows[-1][0]}")
+def stock_cost(ticker):
+    """API requests ``process_stock`` will make for ``ticker`` (0 if up to date)."""
+    last_date = _manifest.last_date(Path(f"{output_base(ticker)}.ledger"))
+    today = datetime.now(MARKET_TZ).date()
+    return int(market_calendar.new_data_possible(market_calendar.US, last_date, today))
+
+
+def queue_stocks(queue, tickers, buffer_days):
+    """Queue one ``process_stock`` unit per ticker, stalest ledger first."""
+    for ticker in tickers:
+        queue.add(
+            f"daily:{ticker}",
+            announced(f"Processing {ticker}...", process_stock, ticker, buffer_days),
+            staleness=_manifest.last_date(Path(f"{output_base(ticker)}.ledger")),
+            cost=stock_cost(ticker),
+        )
+
+
+def announced(message, fn, *args):
+    """A work unit that prints ``message`` and then calls ``fn(*args)``."""
+    def unit():
+        print(message)
+        fn(*args)
+    return unit
+
+
+def grouped_day(day, states):
+    """Append ``day``'s close from one grouped-daily request to every ticker in
+    ``states`` (ticker -> last date) that does not have it yet."""
+    print(f"Grouped daily {day}...")
+    closes = {
+        agg.ticker: float(agg.close)
+        for agg in _client.grouped_daily(day)
+        if agg.close is not None
+    }
+    for ticker, last_date in states.items():
+        if day <= last_date:
+            continue
+        if ticker not in closes:
+            _manifest.record(f"{output_base(ticker)}.ledger")
+            continue
+        print(f"Processing {ticker}...")
+        append_rows(output_base(ticker), [(day, closes[ticker])])
+        states[ticker] = day
+
+
+def queue_grouped(queue, tickers, buffer_days):
+    """Queue one grouped-daily unit per missing day covering every ticker.
+
+    A grouped request returns the bar of every US stock for one date, so a daily
+    run costs one request regardless of the number of tickers; weekends and
+    exchange holidays cost none. Tickers without a ledger, or whose gap is so long
+    that covering it day by day would cost more than fetching them one by one, get
+    a ``process_stock`` unit instead. Each day is appended as soon as it arrives,
+    so a run stopped by its budget leaves every ledger consistent."""
+    states = {}
+    backfill = []
+    for ticker in tickers:
+        last_date = _manifest.last_date(Path(f"{output_base(ticker)}.ledger"))
+        if last_date is None:
+            backfill.append(ticker)
+        else:
+            states[ticker] = last_date
+
+    # Grouped requests cover every day after some cutoff; tickers last updated
+    # before it are cheaper to fetch one by one. Pick the cutoff (one of the
+    # tickers' last dates, or today for "all per-ticker") that minimises the total
+    # number of requests.
+    today = datetime.now(MARKET_TZ).date()
+    days = []
+    if states:
+        cutoffs = set(states.values())
+        best_cost = None
+        for cutoff in sorted(cutoffs | {today}):
+            cutoff_days = market_calendar.trading_days(
+                market_calendar.US, cutoff + timedelta(days=1), today
+            )
+            older = [t for t, last_date in states.items() if last_date < cutoff]
+            if best_cost is None or len(cutoff_days) + len(older) < best_cost:
+                best_cost = len(cutoff_days) + len(older)
+                days, stragglers = cutoff_days, older
+        backfill = [t for t in tickers if t in backfill or t in stragglers]
+        states = {t: d for t, d in states.items() if t not in stragglers}
+
+    if not days and not backfill:
+        print("All tickers up to date; no trading day since their last dates")
+    for day in days:
+        queue.add(
+            f"grouped:{day}",
+            lambda day=day: grouped_day(day, states),
+            staleness=day - timedelta(days=1),
+        )
+    queue_stocks(queue, backfill, buffer_days)
+
+
+def corporate_actions_cost(tickers):
+    """API requests ``process_corporate_actions`` will make (0 if all fresh)."""
+    if all(dividend_cache_fresh(Path(f"{output_base(t)}-dividend.csv")) for t in tickers):
+        return 0
+    return 1 + any(Path(f"{output_base(t)}-split.csv").exists() for t in tickers)
+
+
+def flatfile_closes(path, wanted):
+    """Yield (ticker, date, close) for the ``wanted`` tickers in one flat file.
+
+    Day-aggregate flat files are gzipped CSVs with one row per ticker and a
+    ``window_start`` in nanoseconds; they are read as a stream, never unpacked
+    to disk, and the date follows ``et_date`` like the API bars."""
+    with gzip.open(path, "rt", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        try:
+            ticker_col = header.index("ticker")
+            close_col = header.index("close")
+            ts_col = header.index("window_start")
+        except (AttributeError, ValueError):
+            print(f"  {path.name}: not a day-aggregate file; skipping")
+            return
+        for row in reader:
+            ticker = row[ticker_col]
+            if ticker not in wanted or not row[close_col]:
+                continue
+            yield ticker, et_date(int(row[ts_col]) // 1_000_000), float(row[close_col])
+
+
+def merge_imported(base, rows):
+    """Merge imported (date, close) ``rows`` into the stored series of <base>.
+
+    Days already stored keep their price. Rows after the last day are appended;
+    anything earlier rewrites the series in date order. Returns "appended",
+    "rewritten" or None when nothing was new."""
+    series = price_series(base)
+    stored = series.rows()
+    if not stored or min(d for d, _c in rows) > stored[-1][0]:
+        series.extend(sorted(rows))
+        _manifest.record(series.ledger_path, fetched=False)
+        return "appended"
+
+    merged = dict(stored)
+    new = {d: c for d, c in rows if d not in merged}
+    if not new:
+        return None
+    merged.update(new)
+    series.write(sorted(merged.items()))
+    _manifest.record(series.ledger_path, fetched=False)
+    return "rewritten"
+
+
+def import_flatfiles(directory, tickers):
+    """Merge every day-aggregate flat file under ``directory`` into the ledgers.
+
+    Files are read in date order and merged every FLATFILE_BATCH_DAYS files, so
+    memory holds at most one batch of closes for the configured tickers. Returns
+    the tickers whose history gained days before their previous last date."""
+    paths = sorted(directory.rglob("*.csv.gz"), key=lambda p: p.name)
+    if not paths:
+        sys.exit(f"Error: no *.csv.gz flat files under {directory}.")
+    wanted = {ticker: output_base(ticker) for ticker in tickers}
+    changed, rewritten = set(), set()
+
+    for start in range(0, len(paths), FLATFILE_BATCH_DAYS):
+        batch = paths[start:start + FLATFILE_BATCH_DAYS]
+        print(f"Reading {batch[0].name} .. {batch[-1].name}...")
+        rows = {}
+        for path in batch:
+            for ticker, day, close in flatfile_closes(path, wanted):
+                rows.setdefault(ticker, []).append((day, close))
+        for ticker, ticker_rows in rows.items():
+            result = merge_imported(wanted[ticker], ticker_rows)
+            if result is not None:
+                changed.add(ticker)
+            if result == "rewritten":
+                rewritten.add(ticker)
+
+    for ticker in tickers:
+        if ticker not in changed:
+            print(f"{ticker}: nothing new in the flat files")
+            continue
+        series = price_series(wanted[ticker])
+        rows = series.rows()
+        series.write(rows)
+        for path in series.resampled_paths.values():
+            _manifest.record(path, fetched=False)
+        print(f"{ticker}: {len(rows)} day(s), {rows[0][0]} .. {rows[-1][0]}")
+    return rewritten
 
 
 def main():
@@ -459,6 +1037,19 @@ def main():
         default=20,
         help="Days of backward overlap when fetching the incremental update.",
     )
+    parser.add_argument(
+        "--grouped",
+        action="store_true",
+        help="Fetch missing days with one grouped-daily request per day covering "
+        "all tickers; tickers that need a backfill still use per-ticker requests.",
+    )
+    parser.add_argument(
+        "--import-flatfiles",
+        metavar="DIR",
+        help="Merge the day-aggregate flat files (*.csv.gz, searched recursively) "
+        "in DIR into the ledgers of the configured tickers instead of calling the "
+        "API; days already in a ledger are kept.",
+    )
     parser.add_argument(
         "--dividend-tax-rate",
         type=float,
@@ -476,28 +1067,59 @@ def main():
         "--api-key",
         help="massive.com API key. Falls back to the MASSIVE_API_KEY env var.",
     )
+    parser.add_argument(
+        "--rate-limit",
+        default=DEFAULT_RATE_LIMIT,
+        help="API quota as CALLS/SECONDS, shared on disk between runs "
+        f"(default {DEFAULT_RATE_LIMIT}, the free plan; 0 disables pacing).",
+    )
+    parser.add_argument(
+        "--max-requests",
+        type=int,
+        help="Stop starting new work once this many API requests were made; the "
+        "rest is resumed by the next run (stalest tickers go first).",
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        help="Stop starting new work after this many seconds; the rest is resumed "
+        "by the next run.",
+    )
     parser.add_argument(
         "--suffix",
         default=".us",
         help="Accepted for CLI compatibility with the stooq script; ignored "
         "(massive.com is US-only).",
     )
+    resample.add_arguments(parser)
+    publish.add_arguments(parser)
     args = parser.parse_args()
 
     if args.download_splits and args.ticker is None:
         sys.exit("Error: --download-splits requires --ticker.")
 
-    api_key = args.api_key or os.environ.get("MASSIVE_API_KEY")
-    if not api_key:
-        sys.exit(
-            "Error: no massive.com API key provided. Pass --api-key or set the "
-            "MASSIVE_API_KEY environment variable."
-        )
-
-    global _client
-    _client = MassiveClient(api_key)
-
-    current_stocks, historic_stocks, dividend_tickers = load_config(args.config)
+    try:
+        parse_rate_limit(args.rate_limit)
+        granularities = resample.from_args(args)
+    except ValueError as e:
+        sys.exit(f"Error: {e}")
+    if args.max_requests is not None and args.max_requests < 0:
+        sys.exit("Error: --max-requests must not be negative.")
+    if args.time_budget is not None and args.time_budget < 0:
+        sys.exit("Error: --time-budget must not be negative.")
+
+    global _client, _manifest, _delta, _outputs
+    _manifest = Manifest()
+    _delta = publish.DeltaLog(today=datetime.now(MARKET_TZ).date())
+    _outputs = {
+        "granularities": granularities,
+        "shards": publish.shards_from_args(args),
+    }
+
+    current_stocks, historic_stocks, dividend_tickers, extra_variants = load_config(
+        args.config
+    )
+    variants = [Variant("d", args.dividend_tax_rate)] + extra_variants
 
     stocks = list(current_stocks)
     if args.historic:
@@ -505,26 +1127,93 @@ def main():
     if args.ticker is not None:
         stocks = [args.ticker]
 
-    for ticker in stocks:
-        print(f"Processing {ticker}...")
-        process_stock(ticker, args.buffer_days)
-
     if args.ticker is not None:
         div_targets = [args.ticker] if args.ticker in dividend_tickers else []
     else:
         div_targets = list(dividend_tickers)
 
-    for ticker in div_targets:
-        print(f"Dividends for {ticker}...")
-        process_dividends(ticker)
+    if args.import_flatfiles is not None:
+        rewritten = import_flatfiles(Path(args.import_flatfiles), stocks)
+        for ticker in div_targets:
+            print(f"Dividend-adjusted {ticker}...")
+            if ticker in rewritten:
+                # Older days were inserted: the back-adjusted series starts over.
+                rebuild_dividend_adjusted(ticker, variants)
+            else:
+                process_dividend_adjusted(ticker, variants)
+        save_state()
+        if args.consolidate:
+            publish.consolidate()
+        return
+
+    api_key = args.api_key or os.environ.get("MASSIVE_API_KEY")
+    if not api_key:
+        sys.exit(
+            "Error: no massive.com API key provided. Pass --api-key or set the "
+            "MASSIVE_API_KEY environment variable."
+        )
+    _client = MassiveClient(api_key, args.rate_limit)
+
+    # Completed units are checkpointed per working directory and market date, so
+    # a rerun after a timeout or a --max-requests stop picks up the rest.
+    today = datetime.now(MARKET_TZ).date()
+    queue = WorkQueue(
+        default_checkpoint_path("massive"),
+        f"{Path.cwd().resolve()}@{today}",
+        max_requests=args.max_requests,
+        time_budget=args.time_budget,
+        requests=lambda: _client.calls,
+        on_checkpoint=save_state,
+    )
+
+    if args.grouped and args.ticker is None:
+        queue_grouped(queue, stocks, args.buffer_days)
+    else:
+        queue_stocks(queue, stocks, args.buffer_days)
+
+    # Corporate actions and the adjusted series run after every price unit.
+    if args.ticker is not None:
+        for ticker in div_targets:
+            path = Path(f"{output_base(ticker)}-dividend.csv")
+            queue.add(
+                f"dividends:{ticker}",
+                announced(f"Dividends for {ticker}...", process_dividends, ticker),
+                phase=1,
+                cost=0 if dividend_cache_fresh(path) else 1,
+            )
+    elif div_targets:
+        queue.add(
+            "corporate-actions",
+            lambda: process_corporate_actions(div_targets),
+            phase=1,
+            cost=corporate_actions_cost(div_targets),
+        )
 
     if args.download_splits:
-        print(f"Splits for {args.ticker}...")
-        process_splits(args.ticker)
+        queue.add(
+            f"splits:{args.ticker}",
+            announced(f"Splits for {args.ticker}...", process_splits, args.ticker),
+            phase=1,
+        )
 
     for ticker in div_targets:
-        print(f"Dividend-adjusted {ticker}...")
-        process_dividend_adjusted(ticker, args.dividend_tax_rate)
+        queue.add(
+            f"adjusted:{ticker}",
+            announced(
+                f"Dividend-adjusted {ticker}...",
+                process_dividend_adjusted,
+                ticker,
+                variants,
+            ),
+            staleness=_manifest.last_date(Path(f"{output_base(ticker)}.ledger")),
+            phase=2,
+            cost=0,
+        )
+
+    queue.run()
+    save_state()
+    if args.consolidate:
+        publish.consolidate()
 
 
 if __name__ == "__main__":
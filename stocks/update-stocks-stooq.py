@@ -1,15 +1,32 @@
 #!/usr/bin/env python3
 import argparse
-import csv
 import os
 import sys
-import yaml
 import requests
-from datetime import datetime
+import yaml
+from datetime import date, datetime, timedelta
 from pathlib import Path
-from io import StringIO
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from pricedb import fetch, formats, market_calendar, publish, resample, store
+from pricedb.manifest import Manifest
 
 BASE_URL = "https://stooq.com/q/d/l/"
+# First day of a full download.
+START_DATE = "20150101"
+# Stooq answers without validators, so responses are reused for this long as
+# they are: a rerun after a partial failure costs no hits on the daily limit.
+DEFAULT_CACHE_TTL = 4 * 3600
+
+# Module-level fetcher, initialised in main() from the command line.
+_fetcher = None
+# Manifest of the generated ledgers in the working directory, loaded in main().
+_manifest = None
+# Lines added or changed by this run, for the delta feeds; created in main().
+_delta = None
+# Extra PriceSeries outputs (resampled ledgers, year shards) from the command
+# line, set in main().
+_outputs = {}
 
 
 def load_config(config_path="stocks.yaml"):
@@ -23,72 +40,132 @@ def load_config(config_path="stocks.yaml"):
     )
 
 
-def fetch_stock_data(ticker, skip_div_adjustment=True, suffix=".us"):
-    """Fetch daily CSV data for a US ticker from Stooq."""
+def fetch_stock_data(
+    ticker, skip_div_adjustment=True, suffix=".us", start=START_DATE, ttl=0
+):
+    """Fetch daily CSV data for a US ticker from Stooq, from ``start`` (YYYYMMDD)."""
     today_str = datetime.today().strftime("%Y%m%d")
     # First bit: skip splits = 1, Second bit: skip dividend adjustment
     split_bit = "1"
     div_bit = "1" if skip_div_adjustment else "0"
     o_param = f"{split_bit}{div_bit}00000"
-    url = f"{BASE_URL}?s={ticker}{suffix}&f=20150101&t={today_str}&i=d&o={o_param}"
+    url = f"{BASE_URL}?s={ticker}{suffix}&f={start}&t={today_str}&i=d&o={o_param}"
     api_key = os.environ.get("STOOQ_API_KEY")
     if api_key:
         url += f"&apikey={api_key}"
-    r = requests.get(url)
+    r = _fetcher.get(url, ttl=ttl)
     r.raise_for_status()
     return r.text
 
 
-def format_line(date_str, ticker, close_value, currency="USD"):
-    """Format one ledger line without time component."""
-    dt = datetime.strptime(date_str, "%Y-%m-%d")
-    return f"P {dt.strftime('%Y/%m/%d')} {ticker} {close_value:.2f} {currency}"
+def parse_rows(csv_data):
+    """(date, close) rows of a Stooq CSV, skipping rows without a close."""
+    return list(formats.stooq_rows(csv_data))
+
+
+def output_name(ticker, dividend_adjusted=False):
+    """Ledger commodity / filename stem of one series of a ticker."""
+    return (ticker + ("d" if dividend_adjusted else "")).replace("-", "_")
+
 
+def price_series(name):
+    """The stored series behind <name>.ledger."""
+    return store.PriceSeries(name, name, "USD", delta=_delta, **_outputs)
 
-def process_stock(ticker, dividend_adjusted=False, suffix=".us"):
-    """Download stock CSV and write full and monthly ledgers."""
-    csv_data = fetch_stock_data(ticker, not dividend_adjusted, suffix)
-    reader = csv.DictReader(StringIO(csv_data))
 
-    ticker_output = ticker
-    if dividend_adjusted:
-        ticker_output = ticker_output + "d"
+def process_stock(ticker, rows, dividend_adjusted=False):
+    """Store the ``parse_rows`` of a stock CSV and render full and monthly ledgers."""
+    series = price_series(output_name(ticker, dividend_adjusted))
+    series.write(rows)
+    for path in series.ledger_paths():
+        _manifest.record(path)
 
-    ticker_output = ticker_output.replace("-", "_")
 
-    full_path = Path(f"{ticker_output}.ledger")
-    monthly_path = Path(f"{ticker_output}-monthly.ledger")
+def overlap_matches(name, rows, last_date):
+    """True if ``rows`` agree with the stored series on the days both cover.
 
-    with open(full_path, "w", encoding="utf-8") as full_file, open(
-        monthly_path, "w", encoding="utf-8"
-    ) as monthly_file:
-        last_month = None
-        last_line = None
-        month_dt = None
+    Only the stored rows from the first fetched day on are looked at; at least
+    one common day is required."""
+    series = price_series(name)
+    columns = series.load()
+    if columns is None or not rows:
+        return False
+    stored = dict(columns.rows(columns.index(rows[0][0])))
+    digits = series.meta["digits"]
+    common = [(d, close) for d, close in rows if d <= last_date and d in stored]
+    return bool(common) and all(
+        round(close, digits) == stored[d] for d, close in common
+    )
+
+
+def append_stock(ticker, rows, last_date, dividend_adjusted=False):
+    """Append the ``rows`` after ``last_date`` to one series' store and ledgers."""
+    series = price_series(output_name(ticker, dividend_adjusted))
+    new_rows = [(d, close) for d, close in rows if d > last_date]
+    if not new_rows:
+        _manifest.record(series.ledger_path)
+        print(f"  up to date (last {last_date}); nothing to append")
+        return
+
+    series.extend(new_rows)
+    for path in series.ledger_paths():
+        _manifest.record(path)
+    print(f"  appended {len(new_rows)} day(s): {new_rows[0][0]} .. {new_rows[-1][0]}")
 
-        for row in reader:
-            if not row["Close"]:
-                continue  # skip empty or malformed rows
 
-            close_price = float(row["Close"])
-            date_str = row["Date"]
-            line_usd = format_line(date_str, ticker_output, close_price, "USD")
-            full_file.write(line_usd + "\n")
+def series_of(dual):
+    """The ``dividend_adjusted`` flags of the series a ticker has."""
+    return [False, True] if dual else [False]
 
-            last_line = line_usd
 
-            dt = datetime.strptime(date_str, "%Y-%m-%d")
-            month_key = (dt.year, dt.month)
-            if last_month != month_key:
-                monthly_file.write(line_usd + "\n")
-                last_month = month_key
-                month_dt = dt
+def up_to_date(ticker, dual, last_dates, today):
+    """True if every series of ``ticker`` already has the last US trading day."""
+    return not any(
+        market_calendar.new_data_possible(
+            market_calendar.US, last_dates[output_name(ticker, adjusted)], today
+        )
+        for adjusted in series_of(dual)
+    )
+
 
-        if dt != month_dt:
-            ## We want to print the last available line in the monthly file even
-            ## if it is not at the month's threshold.  This will keep the price
-            ## up to date even when only using monthly history.
-            monthly_file.write(last_line + "\n")
+def plan_stock(ticker, dual, last_dates, args):
+    """Download what one ticker needs; return [(dividend_adjusted, rows, complete)].
+
+    ``complete`` rows rewrite the series, the others are appended after its last
+    date. Without a usable last date the whole history is downloaded. Otherwise only
+    the window from ``--buffer-days`` before it is fetched, and for a dual
+    ticker that is the dividend-adjusted window alone: Stooq back-adjusts, so as
+    long as no dividend went ex inside the window its closes equal the raw ones
+    and one download serves both series. If its overlap with either ledger
+    disagrees, a dividend went ex: the raw window and the full adjusted history
+    are downloaded instead."""
+    suffix, ttl = args.suffix, args.cache_ttl
+    series = series_of(dual)
+    lasts = [last_dates[output_name(ticker, adjusted)] for adjusted in series]
+    if None in lasts:
+        fetched = [
+            (adjusted, fetch_stock_data(ticker, not adjusted, suffix, ttl=ttl))
+            for adjusted in series
+        ]
+        return [(adjusted, parse_rows(text), True) for adjusted, text in fetched]
+
+    # The window starts on the first of a month, so the URL (and with it the
+    # cache key) stays the same after an append and a rerun the same day is
+    # answered from the cache.
+    start = (min(lasts) - timedelta(days=args.buffer_days)).strftime("%Y%m01")
+    rows = parse_rows(fetch_stock_data(ticker, not dual, suffix, start, ttl))
+    if not dual:
+        return [(False, rows, False)]
+    if all(
+        overlap_matches(output_name(ticker, adjusted), rows, last)
+        for adjusted, last in zip(series, lasts)
+    ):
+        return [(False, rows, False), (True, rows, False)]
+
+    print(f"  {ticker}: dividend adjustment changed; refetching {ticker}d")
+    raw_rows = parse_rows(fetch_stock_data(ticker, True, suffix, start, ttl))
+    adjusted_rows = parse_rows(fetch_stock_data(ticker, False, suffix, ttl=ttl))
+    return [(False, raw_rows, False), (True, adjusted_rows, True)]
 
 
 def main():
@@ -107,7 +184,42 @@ def main():
     parser.add_argument(
         "--config", default="config.yaml", help="Path to YAML config file"
     )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--since-last",
+        dest="full_rebuild",
+        action="store_false",
+        default=False,
+        help="Fetch only the window after the last date in each ledger and append "
+        "the new closes (default)",
+    )
+    mode.add_argument(
+        "--full-rebuild",
+        dest="full_rebuild",
+        action="store_true",
+        help=f"Download the whole history since {START_DATE} and rewrite every ledger",
+    )
+    parser.add_argument(
+        "--buffer-days",
+        type=int,
+        default=7,
+        help="Days of backward overlap when fetching the incremental update.",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=int,
+        default=DEFAULT_CACHE_TTL,
+        help="Seconds a cached Stooq response is reused without a request "
+        f"(default {DEFAULT_CACHE_TTL})",
+    )
+    resample.add_arguments(parser)
+    publish.add_arguments(parser)
+    fetch.add_arguments(parser)
     args = parser.parse_args()
+    try:
+        granularities = resample.from_args(args)
+    except ValueError as e:
+        sys.exit(f"Error: {e}")
 
     if not os.environ.get("STOOQ_API_KEY"):
         sys.exit(
@@ -123,13 +235,67 @@ def main():
     if args.ticker is not None:
         stocks = [args.ticker]
 
+    global _fetcher, _manifest, _delta, _outputs
+    _fetcher = fetch.from_args(args)
+    _manifest = Manifest()
+    _delta = publish.DeltaLog()
+    _outputs = {
+        "granularities": granularities,
+        "shards": publish.shards_from_args(args),
+    }
+
+    last_dates = {}
     for ticker in stocks:
-        print(f"Processing {ticker}...")
-        process_stock(ticker, suffix=args.suffix)
+        for adjusted in (False, True):
+            name = output_name(ticker, adjusted)
+            monthly = Path(f"{name}-monthly.ledger")
+            last_dates[name] = (
+                None
+                if args.full_rebuild or not monthly.exists()
+                else _manifest.last_date(f"{name}.ledger")
+            )
+
+    today = date.today()
+    pending = []
+    for ticker in stocks:
+        dual = ticker in dual_download_tickers
+        if up_to_date(ticker, dual, last_dates, today):
+            print(f"{ticker} is up to date")
+            for adjusted in series_of(dual):
+                _manifest.record(f"{output_name(ticker, adjusted)}.ledger")
+        else:
+            pending.append(ticker)
+
+    def download(ticker):
+        dual = ticker in dual_download_tickers
+        return plan_stock(ticker, dual, last_dates, args)
 
-        if ticker in dual_download_tickers:
-            print(f"Processing {ticker}d...")
-            process_stock(ticker, True, suffix=args.suffix)
+    failed = []
+    for ticker, future in _fetcher.map(download, pending):
+        try:
+            plans = future.result()
+        except (requests.RequestException, ValueError) as e:
+            print(f"Failed to download {ticker}: {e}")
+            failed.append(ticker)
+            continue
+        for dividend_adjusted, rows, complete in plans:
+            name = output_name(ticker, dividend_adjusted)
+            print(f"Processing {name}...")
+            if not rows:
+                # e.g. Stooq's daily-limit notice instead of a CSV
+                print(f"  no data for {name}")
+                failed.append(ticker)
+            elif complete:
+                process_stock(ticker, rows, dividend_adjusted)
+            else:
+                append_stock(ticker, rows, last_dates[name], dividend_adjusted)
+    _manifest.save()
+    _delta.save()
+    if args.consolidate:
+        publish.consolidate()
+    if failed:
+        failed = ", ".join(dict.fromkeys(failed))
+        sys.exit(f"Error: failed for {failed}; rerun to retry them")
 
 
 if __name__ == "__main__":